@@ -0,0 +1,120 @@
+"""
+Route history writer for the API Gateway.
+
+Runs in worker processes of a ProcessPoolExecutor so that decoding,
+encoding and COPYing history rows stays off the gateway's event loop. Each worker
+keeps its own event loop and asyncpg connection for its lifetime.
+The route_history_stats rollup is updated in the same transaction.
+"""
+import asyncio
+import asyncpg
+import orjson
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from ...shared.database.models import RouteHistory, RouteHistoryStats
+from ...shared.utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+COLUMNS = [
+    "source_station",
+    "target_station",
+    "route_path",
+    "total_time",
+    "total_distance",
+    "score",
+    "cache_hit",
+    "response_time_ms",
+    "timestamp",
+]
+
+UPDATE_STATS_SQL = f"""
+    INSERT INTO {RouteHistoryStats.__tablename__}
+        (id, total_queries, cache_hits, sum_response_time_ms)
+    VALUES (1, $1, $2, $3)
+    ON CONFLICT (id) DO UPDATE SET
+        total_queries = {RouteHistoryStats.__tablename__}.total_queries + EXCLUDED.total_queries,
+        cache_hits = {RouteHistoryStats.__tablename__}.cache_hits + EXCLUDED.cache_hits,
+        sum_response_time_ms = {RouteHistoryStats.__tablename__}.sum_response_time_ms + EXCLUDED.sum_response_time_ms
+"""
+
+# Per-process state, set up by init_worker
+_dsn: Optional[str] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_connection: Optional[asyncpg.Connection] = None
+
+
+def init_worker(dsn: str) -> None:
+    """Initialize a writer process (ProcessPoolExecutor initializer)."""
+    global _dsn, _loop
+    _dsn = dsn
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+
+
+def flush_batch(rows: List[Tuple]) -> int:
+    """
+    Write a batch of route history rows with COPY.
+    
+    Args:
+        rows: Queued rows, as described in to_record
+        
+    Returns:
+        Number of rows written
+    """
+    return _loop.run_until_complete(_copy_rows(rows))
+
+
+def to_record(row: Tuple) -> Tuple:
+    """
+    Convert a queued row into a COPY record in COLUMNS order.
+    
+    A queued row is (source, destination, route JSON body, cache_hit,
+    response_time_ms, request time as epoch seconds). The route fields
+    are extracted from the response body here, in the writer process.
+    """
+    source, destination, body, cache_hit, response_time_ms, requested_at = row
+    route = orjson.loads(body)
+    return (
+        source,
+        destination,
+        orjson.dumps(route.get("path", [])).decode(),
+        route.get("estimated_time", 0),
+        route.get("distance"),
+        route.get("base_score", 0),
+        cache_hit,
+        response_time_ms,
+        # Request time, so order survives out-of-order flushes across workers
+        datetime.fromtimestamp(requested_at, timezone.utc),
+    )
+
+
+async def _copy_rows(rows: List[Tuple]) -> int:
+    """COPY rows into the history table over the process's connection."""
+    global _connection
+    
+    if _connection is None or _connection.is_closed():
+        _connection = await asyncpg.connect(_dsn)
+    
+    records = [to_record(row) for row in rows]
+    
+    try:
+        async with _connection.transaction():
+            await _connection.copy_records_to_table(
+                RouteHistory.__tablename__,
+                records=records,
+                columns=COLUMNS
+            )
+            await _connection.execute(
+                UPDATE_STATS_SQL,
+                len(records),
+                sum(cache_hit for _, _, _, cache_hit, _, _ in rows),
+                sum(response_time_ms or 0.0 for _, _, _, _, response_time_ms, _ in rows)
+            )
+    except (asyncpg.PostgresConnectionError, ConnectionError):
+        # Reconnect on the next batch
+        _connection = None
+        raise
+    
+    return len(records)
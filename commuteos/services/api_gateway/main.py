@@ -2,31 +2,305 @@
 API Gateway Service for CommuteOS.
 Main entry point with caching, routing, and request handling.
 """
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from contextlib import asynccontextmanager
+import asyncio
 import httpx
+import msgspec
+import multiprocessing
 import time
+from cachetools import TTLCache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...shared.schemas.route_schemas import (
     RouteRequest,
     RouteResponse,
+    RouteResponseMsg,
+    ROUTE_ENCODER,
     HealthResponse,
     ErrorResponse
 )
 from ...shared.config.settings import get_settings
+from ...shared.utils.batching import BatchQueue
 from ...shared.utils.logger import get_logger
-from ...shared.cache.redis_cache import cache_manager, get_cache
-from ...shared.database.connection import db_manager, get_db
-from ...shared.database.models import RouteHistory
+from ...shared.utils.middleware import TimingMiddleware, get_response_time_ms
+from ...shared.cache.redis_cache import cache_manager, compress_raw, get_cache, GetCoalescer
+from ...shared.database.connection import db_manager, get_readonly_db
+from ...shared.database.models import RouteHistory, RouteHistoryStats
+from .history_writer import flush_batch, init_worker
 
 
 logger = get_logger(__name__)
 settings = get_settings()
 
+# Trailing bytes of an encoded RouteResponseMsg (``cached`` is its last field)
+UNCACHED_SUFFIX = b'"cached":false}'
+CACHED_SUFFIX = b'"cached":true}'
+
+# Cached /stats payload
+STATS_CACHE_KEY = "stats:summary"
+STATS_CACHE_TTL = 30  # seconds
+
+# Concurrent route lookups are batched into a single MGET round trip
+route_lookup = GetCoalescer(cache_manager, raw=True)
+
+# In-process L1 in front of Redis: cache key -> response bytes (flag already set).
+# Per process, so DELETE /cache only clears the worker that serves it; the
+# short TTL bounds staleness elsewhere.
+route_l1_cache: TTLCache = TTLCache(
+    maxsize=settings.L1_CACHE_SIZE,
+    ttl=settings.L1_CACHE_TTL
+)
+
+
+class RouteHistoryBuffer:
+    """
+    Buffer route history rows and flush them in batches.
+    
+    Rows (tuples, see history_writer.to_record) are queued by request
+    handlers and drained by a single background task, either when
+    max_batch rows are pending or max_delay_ms has passed since the
+    first one. Each batch is written with COPY by a process pool
+    worker, with up to one batch in flight per worker. If a worker
+    dies, the pool is replaced and the batch retried once. The queue
+    holds max_queue rows and drops the oldest on overflow, so a stalled
+    database can't grow it unbounded.
+    """
+    
+    def __init__(
+        self,
+        max_batch: int,
+        max_delay_ms: float,
+        workers: int,
+        dsn: str,
+        max_queue: int = 10000
+    ):
+        self.workers = workers
+        self.dsn = dsn
+        self.rows = BatchQueue(
+            "route history",
+            self._dispatch,
+            max_batch=max_batch,
+            max_delay_ms=max_delay_ms,
+            max_size=max_queue
+        )
+        self.write_pool: Optional[ProcessPoolExecutor] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+    
+    def _new_pool(self) -> ProcessPoolExecutor:
+        """Create the writer process pool (spawned, not forked from the running loop)."""
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.dsn,)
+        )
+    
+    def start(self):
+        """Start the writer processes and the background flusher."""
+        if self.rows.task is None:
+            self.write_pool = self._new_pool()
+            self._slots = asyncio.Semaphore(self.workers)
+            self.rows.start()
+    
+    async def stop(self):
+        """Flush pending rows, then stop the flusher and writer processes."""
+        if self.rows.task is not None:
+            await self.rows.stop()
+            if self._flushes:
+                await asyncio.gather(*self._flushes)
+            self.write_pool.shutdown(wait=True)
+            self.write_pool = None
+    
+    async def put(self, row: Tuple):
+        """Queue a route history row for the next flush."""
+        self.rows.put(row)
+    
+    async def _dispatch(self, batch: List[Tuple]):
+        """Hand a batch to the next free writer."""
+        # Wait for a free writer before taking the next batch
+        await self._slots.acquire()
+        flush = asyncio.create_task(self._flush(batch))
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flush_done)
+    
+    def _flush_done(self, flush: asyncio.Task):
+        """Release the writer slot held by a finished flush."""
+        self._flushes.discard(flush)
+        self._slots.release()
+    
+    async def _flush(self, batch: List[Tuple]):
+        """Hand a batch of rows to a writer process."""
+        loop = asyncio.get_running_loop()
+        
+        for _ in range(2):
+            pool = self.write_pool
+            try:
+                rows = await loop.run_in_executor(pool, flush_batch, batch)
+            except BrokenProcessPool:
+                # A writer process died and the pool refuses further work;
+                # replace it (once, if several flushes notice) and retry
+                logger.error("Route history writer pool broken, restarting it",
+                            rows=len(batch))
+                if self.write_pool is pool:
+                    pool.shutdown(wait=False)
+                    self.write_pool = self._new_pool()
+                continue
+            except Exception as e:
+                logger.error("Failed to flush route history",
+                            rows=len(batch),
+                            error=str(e))
+                return  # Don't fail the flusher if a batch fails
+            
+            logger.debug("Route history flushed", rows=rows)
+            return
+        
+        logger.error("Failed to flush route history",
+                    rows=len(batch),
+                    error="writer pool broken")
+
+
+# Global route history buffer
+history_buffer = RouteHistoryBuffer(
+    max_batch=settings.HISTORY_BATCH_SIZE,
+    max_delay_ms=settings.HISTORY_FLUSH_MS,
+    workers=settings.HISTORY_WRITE_WORKERS,
+    dsn=settings.database_dsn,
+    max_queue=settings.HISTORY_QUEUE_SIZE
+)
+
+
+class RoutingBatcher:
+    """
+    Coalesce concurrent routing service calls into batch requests.
+    
+    A lone miss is sent on the next loop tick, without a fixed wait.
+    Misses arriving while a batch is in flight are held until it
+    returns and then sent together as /compute_batch calls of at most
+    max_batch_size pairs; identical pairs share a single result.
+    """
+    
+    def __init__(self, max_batch_size: int = 500):
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Tuple[str, str], List[asyncio.Future]] = {}
+        self._requests: Dict[Tuple[str, str], RouteRequest] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    async def compute(
+        self,
+        client: httpx.AsyncClient,
+        request: RouteRequest
+    ) -> Optional[dict]:
+        """
+        Compute a route via the next batched routing service call.
+        
+        Args:
+            client: Shared HTTP client bound to the routing service
+            request: RouteRequest
+            
+        Returns:
+            Route data or None if failed
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pair = (request.source, request.destination)
+        self._requests.setdefault(pair, request)
+        self._pending.setdefault(pair, []).append(future)
+        
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush(client))
+        
+        return await future
+    
+    async def _flush(self, client: httpx.AsyncClient):
+        """Send pending requests, one batch at a time, until none are left."""
+        try:
+            # Let misses from the same loop tick join the first batch
+            await asyncio.sleep(0)
+            
+            while self._pending:
+                pending, self._pending = self._pending, {}
+                requests, self._requests = self._requests, {}
+                await self._send_pending(client, pending, requests)
+        finally:
+            self._flush_task = None
+    
+    async def _send_pending(
+        self,
+        client: httpx.AsyncClient,
+        pending: Dict[Tuple[str, str], List[asyncio.Future]],
+        requests: Dict[Tuple[str, str], RouteRequest]
+    ):
+        """Send one round of pending pairs and resolve their futures."""
+        pairs = list(pending)
+        chunks = [
+            pairs[start:start + self.max_batch_size]
+            for start in range(0, len(pairs), self.max_batch_size)
+        ]
+        
+        try:
+            chunk_results = await asyncio.gather(*(
+                self._send(client, [requests[pair] for pair in chunk])
+                for chunk in chunks
+            ))
+            
+            for chunk, results in zip(chunks, chunk_results):
+                for pair, result in zip(chunk, results):
+                    for future in pending[pair]:
+                        if not future.done():
+                            future.set_result(dict(result) if result is not None else None)
+        except Exception as e:
+            logger.error("Routing batch failed", batch_size=len(pairs), error=str(e))
+        finally:
+            # Never leave a caller waiting on a pair the batch didn't answer
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(None)
+    
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        requests: List[RouteRequest]
+    ) -> List[Optional[dict]]:
+        """Send one chunk of requests, using /compute for a single pair."""
+        if len(requests) == 1:
+            return [await call_routing_service(client, requests[0])]
+        return await call_routing_service_batch(client, requests)
+
+
+# Concurrent cache misses are batched into /compute_batch calls
+routing_batcher = RoutingBatcher(max_batch_size=settings.ROUTING_BATCH_MAX_SIZE)
+
+
+async def init_stats_rollup() -> None:
+    """Create the route history stats row from existing history, if missing."""
+    async for db in db_manager.get_rw_session():
+        # Only scan the history table when the row doesn't exist yet
+        if await db.get(RouteHistoryStats, 1) is None:
+            await db.execute(
+                pg_insert(RouteHistoryStats)
+                .from_select(
+                    ["id", "total_queries", "cache_hits", "sum_response_time_ms"],
+                    select(
+                        literal(1),
+                        func.count(RouteHistory.id),
+                        func.coalesce(func.sum(RouteHistory.cache_hit), 0),
+                        func.coalesce(func.sum(RouteHistory.response_time_ms), 0.0)
+                    )
+                )
+                .on_conflict_do_nothing(index_elements=["id"])
+            )
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -40,6 +314,23 @@ async def lifespan(app: FastAPI):
     # Connect to database
     await db_manager.connect()
     await db_manager.create_tables()
+    await init_stats_rollup()
+    
+    # Shared HTTP client for routing service calls (keep-alive pooling)
+    app.state.http_client = httpx.AsyncClient(
+        base_url=f"http://{settings.ROUTING_SERVICE_HOST}:{settings.ROUTING_SERVICE_PORT}",
+        timeout=settings.REQUEST_TIMEOUT,
+        transport=httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                max_connections=settings.HTTP_MAX_CONNECTIONS
+            ),
+            retries=0
+        )
+    )
+    
+    # Start batched route history writer processes
+    history_buffer.start()
     
     logger.info("API Gateway ready")
     
@@ -47,6 +338,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down API Gateway")
+    await history_buffer.stop()
+    await app.state.http_client.aclose()
     await cache_manager.disconnect()
     await db_manager.disconnect()
 
@@ -56,7 +349,8 @@ app = FastAPI(
     title="CommuteOS API Gateway",
     description="API Gateway for smart commuting system",
     version=settings.APP_VERSION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -68,72 +362,141 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Add request timing middleware (pure ASGI)
+app.add_middleware(TimingMiddleware)
+
 
 def generate_cache_key(source: str, destination: str) -> str:
     """Generate cache key for route query."""
     return f"route:{source}:{destination}"
 
 
-async def call_routing_service(request: RouteRequest) -> Optional[dict]:
+def mark_cached(raw: bytes) -> bytes:
+    """Set the cached flag on a cached route JSON object without decoding it."""
+    if raw.endswith(UNCACHED_SUFFIX):
+        return raw[:-len(UNCACHED_SUFFIX)] + CACHED_SUFFIX
+    # Entries stored before routes were encoded with their flag
+    return raw[:-1] + b',' + CACHED_SUFFIX
+
+
+def store_route(cache_key: str, body: bytes) -> None:
+    """
+    Queue a computed route for caching.
+    
+    The route is stored as the JSON bytes of the miss response,
+    zstd-compressed when large, so cache hits can be returned with
+    mark_cached(). The write is sent by the cache's background
+    writer, off the request path.
+    """
+    try:
+        cache = get_cache()
+        cache.set_raw_async(cache_key, compress_raw(body), ttl=settings.CACHE_TTL)
+    except Exception as e:
+        logger.error("Failed to cache route", key=cache_key, error=str(e))
+        # Don't fail the request if caching fails
+
+
+async def call_routing_service(
+    client: httpx.AsyncClient,
+    request: RouteRequest
+) -> Optional[dict]:
     """
     Call the routing service to compute a route.
     
     Args:
+        client: Shared HTTP client bound to the routing service
         request: RouteRequest
         
     Returns:
         Route data or None if failed
     """
-    routing_url = f"http://{settings.ROUTING_SERVICE_HOST}:{settings.ROUTING_SERVICE_PORT}/compute"
-    
     try:
-        async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as client:
-            response = await client.post(
-                routing_url,
-                json=request.model_dump()
-            )
+        response = await client.post(
+            "/compute",
+            json=request.model_dump()
+        )
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.error("Routing service error",
+                       status_code=response.status_code,
+                       response=response.text)
+            return None
             
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error("Routing service error",
-                           status_code=response.status_code,
-                           response=response.text)
-                return None
-                
     except httpx.TimeoutException:
-        logger.error("Routing service timeout", url=routing_url)
+        logger.error("Routing service timeout", url=str(client.base_url.join("/compute")))
         return None
     except Exception as e:
         logger.error("Routing service call failed", error=str(e))
         return None
 
 
+async def call_routing_service_batch(
+    client: httpx.AsyncClient,
+    requests: List[RouteRequest]
+) -> List[Optional[dict]]:
+    """
+    Call the routing service to compute a batch of routes.
+    
+    Args:
+        client: Shared HTTP client bound to the routing service
+        requests: List of RouteRequest
+        
+    Returns:
+        Route data per request, None where no route was found or the call failed
+    """
+    try:
+        response = await client.post(
+            "/compute_batch",
+            json=[request.model_dump() for request in requests]
+        )
+        
+        if response.status_code == 200:
+            results = response.json()
+            if isinstance(results, list) and len(results) == len(requests):
+                return results
+            logger.error("Routing service returned a malformed batch",
+                       batch_size=len(requests),
+                       results=len(results) if isinstance(results, list) else type(results).__name__)
+        else:
+            logger.error("Routing service error",
+                       status_code=response.status_code,
+                       response=response.text)
+            
+    except httpx.TimeoutException:
+        logger.error("Routing service timeout", url=str(client.base_url.join("/compute_batch")))
+    except Exception as e:
+        logger.error("Routing service call failed", error=str(e))
+    
+    return [None] * len(requests)
+
+
 async def save_route_history(
     source: str,
     destination: str,
-    route_data: dict,
+    body: bytes,
     cache_hit: bool,
-    response_time_ms: float,
-    db: AsyncSession
+    http_request: Request
 ):
-    """Save route query to history table."""
+    """
+    Queue route query for the history table.
+    
+    Runs as a background task after the response has been sent;
+    rows are written in batches by the history buffer. The route is
+    queued as its response JSON and only decoded in the writer process.
+    """
     try:
-        history_entry = RouteHistory(
-            source_station=source,
-            target_station=destination,
-            route_path=route_data.get('path', []),
-            total_time=route_data.get('estimated_time', 0),
-            total_distance=route_data.get('distance'),
-            score=route_data.get('base_score', 0),
-            cache_hit=1 if cache_hit else 0,
-            response_time_ms=response_time_ms
-        )
-        
-        db.add(history_entry)
-        await db.commit()
+        await history_buffer.put((
+            source,
+            destination,
+            body,
+            1 if cache_hit else 0,
+            get_response_time_ms(http_request),
+            time.time()
+        ))
         
-        logger.debug("Route history saved",
+        logger.debug("Route history queued",
                     source=source,
                     destination=destination)
         
@@ -167,18 +530,19 @@ async def health_check():
 @app.post(f"{settings.API_PREFIX}/route", response_model=RouteResponse)
 async def get_route(
     request: RouteRequest,
-    db: AsyncSession = Depends(get_db)
+    http_request: Request,
+    background: BackgroundTasks
 ):
     """
     Get optimal route between two stations.
     
     Flow:
-    1. Check Redis cache
+    1. Check in-process cache, then Redis cache
     2. If cached -> return cached response
     3. If not cached -> call Routing Service
     4. Store result in cache (TTL 600 seconds)
-    5. Save to history
-    6. Return JSON response
+    5. Return JSON response
+    6. Save to history (background task, after response)
     
     Args:
         request: RouteRequest with source and destination
@@ -186,8 +550,6 @@ async def get_route(
     Returns:
         RouteResponse with path, time, distance, and score
     """
-    start_time = time.time()
-    
     logger.info("Route request received",
                source=request.source,
                destination=request.destination)
@@ -195,40 +557,42 @@ async def get_route(
     # Generate cache key
     cache_key = generate_cache_key(request.source, request.destination)
     
-    # Check cache
-    cache = get_cache()
-    cached_result = await cache.get(cache_key)
+    # Check in-process cache, then Redis (batched with concurrent lookups)
+    cached_body = route_l1_cache.get(cache_key)
+    if cached_body is None:
+        cached_raw = await route_lookup.get(cache_key)
+        if cached_raw is not None:
+            cached_body = mark_cached(cached_raw)
+            route_l1_cache[cache_key] = cached_body
     
-    if cached_result is not None:
+    if cached_body is not None:
         # Cache hit
-        response_time = (time.time() - start_time) * 1000
-        
         logger.info("Cache hit",
                    source=request.source,
-                   destination=request.destination,
-                   time_ms=round(response_time, 2))
+                   destination=request.destination)
         
-        # Mark as cached
-        cached_result['cached'] = True
-        
-        # Save to history (async, don't wait)
-        await save_route_history(
+        # Save to history once the response has been sent
+        background.add_task(
+            save_route_history,
             request.source,
             request.destination,
-            cached_result,
+            cached_body,
             cache_hit=True,
-            response_time_ms=response_time,
-            db=db
+            http_request=http_request
         )
         
-        return RouteResponse(**cached_result)
+        # Cached JSON is returned as-is, skipping decode and re-validation
+        return Response(
+            content=cached_body,
+            media_type="application/json"
+        )
     
     # Cache miss - call routing service
     logger.info("Cache miss, calling routing service",
                source=request.source,
                destination=request.destination)
     
-    route_data = await call_routing_service(request)
+    route_data = await routing_batcher.compute(http_request.app.state.http_client, request)
     
     if route_data is None:
         logger.error("Routing service failed",
@@ -239,30 +603,31 @@ async def get_route(
             detail="Routing service unavailable"
         )
     
-    # Store in cache
-    await cache.set(cache_key, route_data, ttl=settings.CACHE_TTL)
+    # Validate and encode once; the same bytes are cached and returned
+    route = msgspec.convert(route_data, RouteResponseMsg)
+    body = ROUTE_ENCODER.encode(route)
     
-    response_time = (time.time() - start_time) * 1000
+    # Store in cache
+    store_route(cache_key, body)
     
     logger.info("Route computed and cached",
                source=request.source,
-               destination=request.destination,
-               time_ms=round(response_time, 2))
+               destination=request.destination)
     
-    # Save to history
-    await save_route_history(
+    # Save to history once the response has been sent
+    background.add_task(
+        save_route_history,
         request.source,
         request.destination,
-        route_data,
+        body,
         cache_hit=False,
-        response_time_ms=response_time,
-        db=db
+        http_request=http_request
     )
     
-    # Mark as not cached
-    route_data['cached'] = False
-    
-    return RouteResponse(**route_data)
+    return Response(
+        content=body,
+        media_type="application/json"
+    )
 
 
 @app.delete(f"{settings.API_PREFIX}/cache")
@@ -270,6 +635,7 @@ async def clear_cache():
     """Clear all cached routes."""
     cache = get_cache()
     success = await cache.clear()
+    route_l1_cache.clear()
     
     if success:
         logger.info("Cache cleared")
@@ -280,32 +646,46 @@ async def clear_cache():
 
 
 @app.get(f"{settings.API_PREFIX}/stats")
-async def get_stats(db: AsyncSession = Depends(get_db)):
-    """Get basic statistics about route queries."""
+async def get_stats(db: AsyncSession = Depends(get_readonly_db)):
+    """
+    Get basic statistics about route queries.
+    
+    Reads the rollup row maintained by the history writer, falling
+    back to aggregating the history table. Results are cached briefly,
+    since they change slowly relative to request volume.
+    """
+    cache = get_cache()
+    cached_stats = await cache.get(STATS_CACHE_KEY)
+    if cached_stats is not None:
+        return cached_stats
+    
     try:
-        from sqlalchemy import select, func
-        
-        # Total queries
-        total_result = await db.execute(
-            select(func.count(RouteHistory.id))
-        )
-        total_queries = total_result.scalar()
+        rollup = await db.get(RouteHistoryStats, 1)
         
-        # Cache hit rate
-        cache_hits_result = await db.execute(
-            select(func.count(RouteHistory.id)).where(RouteHistory.cache_hit == 1)
-        )
-        cache_hits = cache_hits_result.scalar()
-        
-        # Average response time
-        avg_time_result = await db.execute(
-            select(func.avg(RouteHistory.response_time_ms))
-        )
-        avg_response_time = avg_time_result.scalar()
+        if rollup is not None:
+            total_queries = rollup.total_queries
+            cache_hits = rollup.cache_hits
+            avg_response_time = (
+                rollup.sum_response_time_ms / total_queries if total_queries > 0 else None
+            )
+        else:
+            # Hits are counted from the partial cache_hit index; the predicate
+            # is inlined so the planner can match the index condition
+            hits = (
+                select(func.count(RouteHistory.id))
+                .where(RouteHistory.cache_hit == literal_column("1"))
+                .scalar_subquery()
+            )
+            stmt = select(
+                func.count(RouteHistory.id),
+                hits,
+                func.avg(RouteHistory.response_time_ms)
+            )
+            total_queries, cache_hits, avg_response_time = (await db.execute(stmt)).one()
         
         cache_hit_rate = (cache_hits / total_queries * 100) if total_queries > 0 else 0
         
-        return {
+        stats = {
             "total_queries": total_queries,
             "cache_hits": cache_hits,
             "cache_hit_rate": round(cache_hit_rate, 2),
@@ -315,6 +695,9 @@ async def get_stats(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         logger.error("Failed to get stats", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
+    
+    await cache.set(STATS_CACHE_KEY, stats, ttl=STATS_CACHE_TTL)
+    return stats
 
 
 if __name__ == "__main__":
@@ -3,11 +3,11 @@ Data Ingestion Service for CommuteOS.
 Loads mock GTFS-like data and seeds the database.
 """
 import asyncio
-import json
-from pathlib import Path
+import orjson
 from typing import Dict, List
-from sqlalchemy import select
+from sqlalchemy import insert, literal, select
 
+from ...shared.graph.loader import default_graph_file, load_graph_csr_and_rows
 from ...shared.database.connection import db_manager, get_db
 from ...shared.database.models import Station, Edge
 from ...shared.utils.logger import get_logger
@@ -22,68 +22,55 @@ class DataIngestion:
     """Handle data ingestion and database seeding."""
     
     def __init__(self):
-        self.graph_data: Dict = {}
+        self.station_rows: List[Dict] = []
+        self.edge_rows: List[Dict] = []
     
     def load_graph_data(self, graph_file: str = None) -> None:
-        """Load graph data from JSON file."""
+        """Load graph data from a binary (.npz) or JSON file."""
         if graph_file is None:
             # Use the same graph as routing service
-            graph_file = Path(__file__).parent.parent / "routing_service" / "data" / "mock_city_graph.json"
+            graph_file = default_graph_file()
         
         logger.info("Loading graph data", file=str(graph_file))
         
         try:
-            with open(graph_file, 'r') as f:
-                self.graph_data = json.load(f)
+            # Same single pass the routing engine uses; CSR arrays are unused here
+            _, self.station_rows, self.edge_rows = load_graph_csr_and_rows(graph_file)
             
             logger.info("Graph data loaded",
-                       stations=len(self.graph_data.get('stations', {})),
-                       edges=len(self.graph_data.get('edges', [])))
+                       stations=len(self.station_rows),
+                       edges=len(self.edge_rows))
         
         except FileNotFoundError:
             logger.error("Graph file not found", file=str(graph_file))
             raise
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error("Invalid JSON in graph file", error=str(e))
             raise
     
     async def seed_stations(self) -> None:
         """Seed stations table."""
-        stations_data = self.graph_data.get('stations', {})
+        rows = self.station_rows
         
-        if not stations_data:
+        if not rows:
             logger.warning("No stations data to seed")
             return
         
         logger.info("Seeding stations table")
         
-        async for db in db_manager.get_session():
+        async for db in db_manager.get_rw_session():
             try:
                 # Check if stations already exist
-                result = await db.execute(select(Station))
-                existing_stations = result.scalars().all()
+                result = await db.execute(select(literal(1)).select_from(Station).limit(1))
                 
-                if existing_stations:
-                    logger.info("Stations already exist, skipping seed",
-                               count=len(existing_stations))
+                if result.first() is not None:
+                    logger.info("Stations already exist, skipping seed")
                     return
                 
-                # Insert stations
-                stations_inserted = 0
-                for station_id, station_info in stations_data.items():
-                    station = Station(
-                        station_id=station_id,
-                        name=station_info.get('name', station_id),
-                        latitude=station_info.get('latitude', 0.0),
-                        longitude=station_info.get('longitude', 0.0),
-                        station_type=station_info.get('type', 'unknown'),
-                        station_metadata={}
-                    )
-                    db.add(station)
-                    stations_inserted += 1
-                
+                # Insert stations in a single bulk INSERT
+                await db.execute(insert(Station), rows)
                 await db.commit()
-                logger.info("Stations seeded successfully", count=stations_inserted)
+                logger.info("Stations seeded successfully", count=len(rows))
                 
             except Exception as e:
                 logger.error("Failed to seed stations", error=str(e))
@@ -92,44 +79,27 @@ class DataIngestion:
     
     async def seed_edges(self) -> None:
         """Seed edges table."""
-        edges_data = self.graph_data.get('edges', [])
+        rows = self.edge_rows
         
-        if not edges_data:
+        if not rows:
             logger.warning("No edges data to seed")
             return
         
         logger.info("Seeding edges table")
         
-        async for db in db_manager.get_session():
+        async for db in db_manager.get_rw_session():
             try:
                 # Check if edges already exist
-                result = await db.execute(select(Edge))
-                existing_edges = result.scalars().all()
+                result = await db.execute(select(literal(1)).select_from(Edge).limit(1))
                 
-                if existing_edges:
-                    logger.info("Edges already exist, skipping seed",
-                               count=len(existing_edges))
+                if result.first() is not None:
+                    logger.info("Edges already exist, skipping seed")
                     return
                 
-                # Insert edges
-                edges_inserted = 0
-                for idx, edge_info in enumerate(edges_data):
-                    edge_id = f"edge_{edge_info['source']}_{edge_info['target']}_{idx}"
-                    
-                    edge = Edge(
-                        edge_id=edge_id,
-                        source_station=edge_info['source'],
-                        target_station=edge_info['target'],
-                        distance=edge_info.get('distance', 0.0),
-                        travel_time=edge_info.get('travel_time', 0.0),
-                        transport_type=edge_info.get('transport_type', 'unknown'),
-                        edge_metadata={}
-                    )
-                    db.add(edge)
-                    edges_inserted += 1
-                
+                # Insert edges in a single bulk INSERT
+                await db.execute(insert(Edge), rows)
                 await db.commit()
-                logger.info("Edges seeded successfully", count=edges_inserted)
+                logger.info("Edges seeded successfully", count=len(rows))
                 
             except Exception as e:
                 logger.error("Failed to seed edges", error=str(e))
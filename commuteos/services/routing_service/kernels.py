@@ -0,0 +1,63 @@
+"""
+Compiled graph search kernels for the routing engine.
+
+Kernels operate directly on the CSR arrays (indptr, indices, weights)
+and are compiled with Numba on first use; compiled code is cached on
+disk, and warm_up() compiles them ahead of the first request.
+"""
+import heapq
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, boundscheck=False)
+def dijkstra(indptr, indices, weights, src, tgt, dist, pred):
+    """
+    Point-to-point Dijkstra over CSR arrays, stopping once tgt is settled.
+
+    Args:
+        indptr: CSR row pointers, shape (N + 1,)
+        indices: CSR edge targets, shape (E,)
+        weights: CSR edge weights, shape (E,)
+        src: Source node index
+        tgt: Target node index
+        dist: Output distances, shape (N,)
+        pred: Output predecessors (-1 where none), shape (N,)
+
+    Returns:
+        Distance to tgt (inf if unreachable)
+    """
+    dist[:] = np.inf
+    pred[:] = -1
+    settled = np.zeros(dist.shape[0], dtype=np.bool_)
+
+    dist[src] = 0.0
+    heap = [(0.0, src)]
+
+    while len(heap) > 0:
+        d, u = heapq.heappop(heap)
+        if settled[u]:
+            continue
+        settled[u] = True
+        if u == tgt:
+            break
+
+        for pos in range(indptr[u], indptr[u + 1]):
+            v = np.int64(indices[pos])
+            nd = d + weights[pos]
+            if nd < dist[v]:
+                dist[v] = nd
+                pred[v] = u
+                heapq.heappush(heap, (nd, v))
+
+    return dist[tgt]
+
+
+def warm_up() -> None:
+    """Compile the kernels for the CSR dtypes used by the routing engine."""
+    indptr = np.array([0, 1, 1], dtype=np.int32)
+    indices = np.array([1], dtype=np.int32)
+    weights = np.array([1.0], dtype=np.float64)
+    dist = np.empty(2, dtype=np.float64)
+    pred = np.empty(2, dtype=np.int64)
+    dijkstra(indptr, indices, weights, np.int64(0), np.int64(1), dist, pred)
@@ -3,26 +3,33 @@ Routing Service FastAPI application.
 Handles route computation requests.
 """
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
 import time
 from datetime import datetime
+from typing import List, Optional
+from . import kernels
 from .routing_engine import RoutingEngine
 from ...shared.schemas.route_schemas import (
     RouteRequest, 
     RouteResponse, 
+    RouteResponseMsg,
     HealthResponse,
     ErrorResponse
 )
 from ...shared.config.settings import get_settings
 from ...shared.utils.logger import get_logger
+from ...shared.utils.responses import MsgspecJSONResponse
 
 
 logger = get_logger(__name__)
 settings = get_settings()
 
 # Global routing engine instance
-routing_engine = RoutingEngine()
+routing_engine = RoutingEngine(
+    precompute_max_nodes=settings.ROUTING_PRECOMPUTE_MAX_NODES,
+    use_csr=settings.ROUTING_USE_CSR
+)
 
 
 @asynccontextmanager
@@ -31,6 +38,9 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Routing Service")
     routing_engine.load_graph()
+    
+    # Compile search kernels before the first request
+    kernels.warm_up()
     logger.info("Routing Service ready")
     
     yield
@@ -44,7 +54,8 @@ app = FastAPI(
     title="CommuteOS Routing Service",
     description="Graph-based routing service for smart commuting",
     version=settings.APP_VERSION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -98,13 +109,12 @@ async def compute_route(request: RouteRequest):
                    destination=request.destination,
                    time_ms=round(computation_time, 2))
         
-        return RouteResponse(
+        return MsgspecJSONResponse(RouteResponseMsg(
             path=result['path'],
             estimated_time=result['estimated_time'],
             distance=result.get('distance'),
-            base_score=result['base_score'],
-            cached=False
-        )
+            base_score=result['base_score']
+        ))
         
     except HTTPException:
         raise
@@ -116,6 +126,52 @@ async def compute_route(request: RouteRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/compute_batch", response_model=List[Optional[RouteResponse]])
+async def compute_route_batch(requests: List[RouteRequest]):
+    """
+    Compute optimal routes for a batch of station pairs.
+    
+    Args:
+        requests: List of RouteRequest
+        
+    Returns:
+        List of RouteResponse in request order, null where no route exists
+    """
+    if len(requests) > settings.ROUTING_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch size exceeds limit of {settings.ROUTING_BATCH_MAX_SIZE}"
+        )
+    
+    start_time = time.time()
+    
+    try:
+        results = routing_engine.compute_routes(
+            [(request.source, request.destination) for request in requests]
+        )
+    except Exception as e:
+        logger.error("Batch route computation failed",
+                    batch_size=len(requests),
+                    error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    computation_time = (time.time() - start_time) * 1000  # milliseconds
+    
+    logger.info("Batch routes computed",
+               batch_size=len(requests),
+               time_ms=round(computation_time, 2))
+    
+    return MsgspecJSONResponse([
+        RouteResponseMsg(
+            path=result['path'],
+            estimated_time=result['estimated_time'],
+            distance=result.get('distance'),
+            base_score=result['base_score']
+        ) if result is not None else None
+        for result in results
+    ])
+
+
 @app.get("/station/{station_id}")
 async def get_station(station_id: str):
     """Get station information."""
@@ -2,24 +2,116 @@
 Redis caching layer for CommuteOS.
 Non-blocking async operations with connection pooling.
 """
-import json
-from typing import Any, Optional
+import asyncio
+import msgspec
+import orjson
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import redis.asyncio as aioredis
-from redis.asyncio.connection import ConnectionPool
-from ..config.settings import get_settings
+import zstandard
+from redis._parsers import _AsyncHiredisParser
+from redis.asyncio.client import Pipeline
+from redis.asyncio.connection import BlockingConnectionPool
+from ..config.settings import SETTINGS as settings
+from ..utils.batching import BatchQueue
 from ..utils.logger import get_logger
 
 
 logger = get_logger(__name__)
 
 
+# Namespace for all CommuteOS keys, so clear() only touches our own keys
+KEY_PREFIX = "commuteos:"
+
+# Keys per SCAN page / UNLINK call in clear()
+CLEAR_BATCH_SIZE = 500
+
+
+def _key(key: str) -> str:
+    """Namespace a cache key."""
+    return KEY_PREFIX + key
+
+
+# Cache values are msgpack, tagged with a format version prefix, or
+# zstd-compressed msgpack behind a one-byte marker when larger than
+# COMPRESS_MIN_SIZE. Untagged values are legacy JSON entries. Raw values
+# (cached JSON bodies) use the same marker when compressed.
+MSGPACK_PREFIX = b"v1:"
+ZSTD_MARKER = b"\x01"
+COMPRESS_MIN_SIZE = 512
+
+
+def _enc_hook(obj: Any) -> Any:
+    """Encode NumPy arrays and scalars as plain Python values."""
+    tolist = getattr(obj, "tolist", None)
+    if tolist is None:
+        raise NotImplementedError(f"Cannot serialize {type(obj).__name__}")
+    return tolist()
+
+
+_encoder = msgspec.msgpack.Encoder(enc_hook=_enc_hook)
+_decoder = msgspec.msgpack.Decoder()
+_compressor = zstandard.ZstdCompressor(level=3)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def _dumps(value: Any) -> bytes:
+    """Serialize a cache value, compressing large ones."""
+    encoded = _encoder.encode(value)
+    if len(encoded) > COMPRESS_MIN_SIZE:
+        return ZSTD_MARKER + _compressor.compress(encoded)
+    return MSGPACK_PREFIX + encoded
+
+
+def compress_raw(value: bytes) -> bytes:
+    """Compress a raw cache value if it is larger than COMPRESS_MIN_SIZE."""
+    if len(value) > COMPRESS_MIN_SIZE:
+        return ZSTD_MARKER + _compressor.compress(value)
+    return value
+
+
+def decompress_raw(value: bytes) -> bytes:
+    """Undo compress_raw; uncompressed values are returned as-is."""
+    if value.startswith(ZSTD_MARKER):
+        return _decompressor.decompress(memoryview(value)[1:])
+    return value
+
+
+def _loads(value: bytes) -> Any:
+    """Deserialize a cache value, msgpack (optionally compressed) or legacy JSON."""
+    if value.startswith(ZSTD_MARKER):
+        return _decoder.decode(_decompressor.decompress(memoryview(value)[1:]))
+    if value.startswith(MSGPACK_PREFIX):
+        return _decoder.decode(memoryview(value)[len(MSGPACK_PREFIX):])
+    return orjson.loads(value)
+
+
 class CacheManager:
-    """Async Redis cache manager with connection pooling."""
+    """
+    Async Redis cache manager with connection pooling.
+    
+    Besides the awaited operations, ``*_async`` methods queue writes
+    for a background writer that sends them in pipelined batches of up
+    to WRITE_BATCH, waiting at most WRITE_DELAY_MS to fill one. The
+    queue holds WRITE_QUEUE_SIZE writes and drops the oldest on overflow.
+    """
+    
+    WRITE_QUEUE_SIZE = 10000
+    WRITE_BATCH = 100
+    WRITE_DELAY_MS = 1
+    
+    __slots__ = (
+        "redis_client",
+        "pool",
+        "_default_ttl",
+        "_writes",
+    )
     
     def __init__(self):
         self.redis_client: Optional[aioredis.Redis] = None
-        self.pool: Optional[ConnectionPool] = None
-        self.settings = get_settings()
+        self.pool: Optional[BlockingConnectionPool] = None
+        self._default_ttl: int = settings.CACHE_TTL
+        self._writes: Optional[BatchQueue] = None
     
     async def connect(self):
         """Initialize Redis connection with connection pooling."""
@@ -28,27 +120,61 @@ class CacheManager:
             return
         
         logger.info("Initializing Redis connection",
-                   host=self.settings.REDIS_HOST,
-                   port=self.settings.REDIS_PORT)
+                   host=settings.REDIS_HOST,
+                   port=settings.REDIS_PORT)
         
-        self.pool = ConnectionPool.from_url(
-            self.settings.redis_url,
-            max_connections=self.settings.REDIS_POOL_SIZE,
-            decode_responses=True,
+        # Requests wait for a free connection rather than failing once
+        # the pool is exhausted; reads are batched and writes pipelined,
+        # so a few connections cover the gateway's concurrency
+        self.pool = BlockingConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=settings.REDIS_POOL_MAX_SIZE,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            # Require the C reply parser rather than silently falling back
+            # to the pure-Python one when hiredis is missing
+            parser_class=_AsyncHiredisParser,
+            # Values stay as bytes: cached JSON is passed through as-is and
+            # orjson/msgpack decode bytes directly, without an interim str
+            decode_responses=False,
         )
         
         self.redis_client = aioredis.Redis(connection_pool=self.pool)
         
-        # Test connection
+        # Test connection and open the minimum pool size up front
         try:
             await self.redis_client.ping()
+            await self._prewarm(settings.REDIS_POOL_MIN_SIZE)
             logger.info("Redis connection established successfully")
-        except Exception as e:
-            logger.error("Failed to connect to Redis", error=str(e))
+        except Exception:
+            logger.error("Failed to connect to Redis", exc_info=True)
             raise
+        
+        # Start background writer for fire-and-forget writes
+        self._writes = BatchQueue(
+            "cache writes",
+            self._flush_writes,
+            max_batch=self.WRITE_BATCH,
+            max_delay_ms=self.WRITE_DELAY_MS,
+            max_size=self.WRITE_QUEUE_SIZE
+        )
+        self._writes.start()
+    
+    async def _prewarm(self, size: int):
+        """Open up to size pooled connections, so early requests skip connect."""
+        connections = []
+        try:
+            for _ in range(min(size, self.pool.max_connections)):
+                connections.append(await self.pool.get_connection("PING"))
+        finally:
+            for connection in connections:
+                await self.pool.release(connection)
     
     async def disconnect(self):
-        """Close Redis connection."""
+        """Flush queued writes and close Redis connection."""
+        if self._writes is not None:
+            await self._writes.stop()
+            self._writes = None
+        
         if self.redis_client is not None:
             logger.info("Closing Redis connection")
             await self.redis_client.close()
@@ -70,14 +196,16 @@ class CacheManager:
             raise RuntimeError("Redis not connected. Call connect() first.")
         
         try:
-            value = await self.redis_client.get(key)
+            value = await self.redis_client.get(_key(key))
             if value:
-                logger.debug("Cache hit", key=key)
-                return json.loads(value)
-            logger.debug("Cache miss", key=key)
+                if logger.debug_enabled:
+                    logger.debug("Cache hit", key=key)
+                return _loads(value)
+            if logger.debug_enabled:
+                logger.debug("Cache miss", key=key)
             return None
-        except Exception as e:
-            logger.error("Cache get error", key=key, error=str(e))
+        except Exception:
+            logger.error("Cache get error", key=key, exc_info=True)
             return None  # Fail gracefully
     
     async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
@@ -86,7 +214,7 @@ class CacheManager:
         
         Args:
             key: Cache key
-            value: Value to cache (will be JSON serialized)
+            value: Value to cache (msgpack serialized)
             ttl: Time to live in seconds (default: from settings)
             
         Returns:
@@ -96,15 +224,114 @@ class CacheManager:
             raise RuntimeError("Redis not connected. Call connect() first.")
         
         try:
-            ttl = ttl or self.settings.CACHE_TTL
-            serialized_value = json.dumps(value)
-            await self.redis_client.setex(key, ttl, serialized_value)
-            logger.debug("Cache set", key=key, ttl=ttl)
+            ttl = ttl or self._default_ttl
+            serialized_value = _dumps(value)
+            await self.redis_client.setex(_key(key), ttl, serialized_value)
+            if logger.debug_enabled:
+                logger.debug("Cache set", key=key, ttl=ttl)
+            return True
+        except Exception:
+            logger.error("Cache set error", key=key, exc_info=True)
+            return False
+    
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Get multiple values from cache in one round trip.
+        
+        Args:
+            keys: Cache keys
+            
+        Returns:
+            Cached values in key order, None where not found
+        """
+        if self.redis_client is None:
+            raise RuntimeError("Redis not connected. Call connect() first.")
+        
+        if not keys:
+            return []
+        
+        try:
+            values = await self.redis_client.mget([_key(key) for key in keys])
+            if logger.debug_enabled:
+                logger.debug("Cache mget", keys=len(keys))
+            return [_loads(value) if value else None for value in values]
+        except Exception:
+            logger.error("Cache mget error", keys=len(keys), exc_info=True)
+            return [None] * len(keys)  # Fail gracefully
+    
+    async def mset(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """
+        Set multiple values in cache with one pipelined round trip.
+        
+        Args:
+            items: Mapping of cache key to value
+            ttl: Time to live in seconds (default: from settings)
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if self.redis_client is None:
+            raise RuntimeError("Redis not connected. Call connect() first.")
+        
+        if not items:
+            return True
+        
+        try:
+            ttl = ttl or self._default_ttl
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(_key(key), ttl, _dumps(value))
+                await pipe.execute()
+            if logger.debug_enabled:
+                logger.debug("Cache mset", keys=len(items), ttl=ttl)
             return True
-        except Exception as e:
-            logger.error("Cache set error", key=key, error=str(e))
+        except Exception:
+            logger.error("Cache mset error", keys=len(items), exc_info=True)
             return False
     
+    def set_async(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """
+        Queue a cache set without waiting for Redis.
+        
+        Args:
+            key: Cache key
+            value: Value to cache (serialized immediately)
+            ttl: Time to live in seconds (default: from settings)
+        """
+        self.set_raw_async(key, _dumps(value), ttl)
+    
+    def set_raw_async(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        """
+        Queue a set of an already serialized value without waiting for Redis.
+        
+        Args:
+            key: Cache key
+            value: Serialized value
+            ttl: Time to live in seconds (default: from settings)
+        """
+        self._enqueue((_key(key), value, ttl or self._default_ttl))
+    
+    def _enqueue(self, item: Tuple) -> None:
+        """Queue a write for the background writer."""
+        if self._writes is None:
+            raise RuntimeError("Redis not connected. Call connect() first.")
+        self._writes.put(item)
+    
+    async def _flush_writes(self, batch: List[Tuple]):
+        """Send a batch of queued writes in one pipeline."""
+        try:
+            async with self.pipeline() as pipe:
+                for key, value, ttl in batch:
+                    pipe.setex(key, ttl, value)
+                await pipe.execute()
+            
+            if logger.debug_enabled:
+                logger.debug("Cache writes flushed", writes=len(batch))
+            
+        except Exception:
+            logger.error("Cache write flush error", writes=len(batch), exc_info=True)
+            # Cache writes are best effort
+    
     async def delete(self, key: str) -> bool:
         """
         Delete key from cache.
@@ -119,16 +346,21 @@ class CacheManager:
             raise RuntimeError("Redis not connected. Call connect() first.")
         
         try:
-            result = await self.redis_client.delete(key)
-            logger.debug("Cache delete", key=key, deleted=bool(result))
+            result = await self.redis_client.delete(_key(key))
+            if logger.debug_enabled:
+                logger.debug("Cache delete", key=key, deleted=bool(result))
             return bool(result)
-        except Exception as e:
-            logger.error("Cache delete error", key=key, error=str(e))
+        except Exception:
+            logger.error("Cache delete error", key=key, exc_info=True)
             return False
     
     async def clear(self) -> bool:
         """
-        Clear all cache entries.
+        Clear all CommuteOS cache entries.
+        
+        Keys under KEY_PREFIX are found with SCAN and removed with
+        UNLINK in batches, so Redis is never blocked on the whole
+        keyspace and memory is freed in the background.
         
         Returns:
             True if successful, False otherwise
@@ -137,11 +369,25 @@ class CacheManager:
             raise RuntimeError("Redis not connected. Call connect() first.")
         
         try:
-            await self.redis_client.flushdb()
-            logger.info("Cache cleared")
+            deleted = 0
+            batch: List[bytes] = []
+            
+            async for key in self.redis_client.scan_iter(
+                match=f"{KEY_PREFIX}*",
+                count=CLEAR_BATCH_SIZE
+            ):
+                batch.append(key)
+                if len(batch) >= CLEAR_BATCH_SIZE:
+                    deleted += await self.redis_client.unlink(*batch)
+                    batch = []
+            
+            if batch:
+                deleted += await self.redis_client.unlink(*batch)
+            
+            logger.info("Cache cleared", keys=deleted)
             return True
-        except Exception as e:
-            logger.error("Cache clear error", error=str(e))
+        except Exception:
+            logger.error("Cache clear error", exc_info=True)
             return False
     
     async def exists(self, key: str) -> bool:
@@ -158,10 +404,117 @@ class CacheManager:
             raise RuntimeError("Redis not connected. Call connect() first.")
         
         try:
-            return await self.redis_client.exists(key) > 0
-        except Exception as e:
-            logger.error("Cache exists error", key=key, error=str(e))
+            return await self.redis_client.exists(_key(key)) > 0
+        except Exception:
+            logger.error("Cache exists error", key=key, exc_info=True)
             return False
+    
+    @asynccontextmanager
+    async def pipeline(self) -> AsyncIterator[Pipeline]:
+        """
+        Open a non-transactional pipeline.
+        
+        Commands queued on the pipeline are sent in a single
+        round trip when ``execute()`` is awaited. Keys are used as
+        given, without KEY_PREFIX.
+        """
+        if self.redis_client is None:
+            raise RuntimeError("Redis not connected. Call connect() first.")
+        
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            yield pipe
+
+
+class GetCoalescer:
+    """
+    Coalesce concurrent cache lookups into one pipelined MGET.
+    
+    A lone lookup is sent on the next loop tick, without a fixed wait.
+    Lookups issued while an MGET is in flight are held until it returns
+    and then share the next round trip. With ``raw=True`` values are
+    returned as the cached bytes, decompressed if needed, instead of
+    being decoded.
+    """
+    
+    def __init__(self, cache: CacheManager, raw: bool = False):
+        self.cache = cache
+        self.raw = raw
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get value from cache via the next batched MGET.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Cached value or None if not found
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush())
+        
+        return await future
+    
+    async def _flush(self):
+        """Send pending lookups, one MGET at a time, until none are left."""
+        try:
+            # Let lookups made in the same loop tick join the first MGET
+            await asyncio.sleep(0)
+            
+            while self._pending:
+                pending, self._pending = self._pending, {}
+                try:
+                    await self._fetch(pending)
+                finally:
+                    # Never leave a caller waiting on a key the MGET didn't answer
+                    for futures in pending.values():
+                        for future in futures:
+                            if not future.done():
+                                future.set_result(None)
+        finally:
+            self._flush_task = None
+    
+    async def _fetch(self, pending: Dict[str, List[asyncio.Future]]):
+        """Fetch pending keys in one MGET and resolve their futures."""
+        keys = list(pending)
+        
+        try:
+            async with self.cache.pipeline() as pipe:
+                pipe.mget([_key(key) for key in keys])
+                results = await pipe.execute()
+            values = results[0]
+            if logger.debug_enabled:
+                logger.debug("Cache lookups coalesced", keys=len(keys))
+        except Exception:
+            logger.error("Cache mget error", keys=len(keys), exc_info=True)
+            values = [None] * len(keys)  # Fail gracefully
+        
+        for key, value in zip(keys, values):
+            try:
+                if self.raw and value:
+                    value = decompress_raw(value)
+                for future in pending[key]:
+                    if future.done():
+                        continue
+                    if not value:
+                        future.set_result(None)
+                    elif self.raw:
+                        future.set_result(value)
+                    else:
+                        # Decode per waiter so callers can mutate their copy
+                        future.set_result(_loads(value))
+            except Exception:
+                # Treat an undecodable entry as a miss, like get()
+                logger.error("Cache decode error", key=key, exc_info=True)
+                for future in pending[key]:
+                    if not future.done():
+                        future.set_result(None)
 
 
 # Global cache manager instance
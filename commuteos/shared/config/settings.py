@@ -2,6 +2,7 @@
 Configuration management for CommuteOS.
 Environment-based settings using Pydantic BaseSettings.
 """
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 from functools import lru_cache
@@ -29,18 +30,27 @@ class Settings(BaseSettings):
     DB_PASSWORD: str = "postgres"
     DB_POOL_SIZE: int = 20
     DB_MAX_OVERFLOW: int = 10
+    DB_STATEMENT_CACHE_SIZE: int = 1024
     
     # Redis
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: Optional[str] = None
-    REDIS_POOL_SIZE: int = 10
+    REDIS_POOL_MIN_SIZE: int = 2  # Connections opened at startup
+    REDIS_POOL_MAX_SIZE: int = 8
+    REDIS_POOL_TIMEOUT: int = 5  # Seconds to wait for a free connection
+    REDIS_POOL_SIZE: Optional[int] = None  # Deprecated alias for REDIS_POOL_MAX_SIZE
     CACHE_TTL: int = 600  # 10 minutes default
+    L1_CACHE_SIZE: int = 1024  # In-process route cache entries
+    L1_CACHE_TTL: int = 60
     
     # Routing Service
     ROUTING_SERVICE_HOST: str = "routing_service"
     ROUTING_SERVICE_PORT: int = 8001
+    ROUTING_PRECOMPUTE_MAX_NODES: int = 2000
+    ROUTING_USE_CSR: bool = True  # False switches to the NetworkX backend
+    ROUTING_BATCH_MAX_SIZE: int = 500
     
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -49,16 +59,34 @@ class Settings(BaseSettings):
     # Performance
     MAX_WORKERS: int = 4
     REQUEST_TIMEOUT: int = 30
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 64
+    HTTP_MAX_CONNECTIONS: int = 128
+    HISTORY_WRITE_WORKERS: int = 2  # Processes writing route history
+    HISTORY_BATCH_SIZE: int = 200  # Rows per history COPY
+    HISTORY_FLUSH_MS: float = 100.0  # Max wait to fill a history batch
+    HISTORY_QUEUE_SIZE: int = 10000  # Pending history rows; oldest dropped when full
     
     class Config:
         env_file = ".env"
         case_sensitive = True
     
+    @model_validator(mode="after")
+    def apply_deprecated_redis_pool_size(self) -> "Settings":
+        """Honor REDIS_POOL_SIZE from older .env files unless the max size is set."""
+        if self.REDIS_POOL_SIZE is not None and "REDIS_POOL_MAX_SIZE" not in self.model_fields_set:
+            self.REDIS_POOL_MAX_SIZE = self.REDIS_POOL_SIZE
+        return self
+    
     @property
     def database_url(self) -> str:
         """Construct async PostgreSQL database URL."""
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    @property
+    def database_dsn(self) -> str:
+        """Construct plain PostgreSQL DSN for direct asyncpg connections."""
+        return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+    
     @property
     def redis_url(self) -> str:
         """Construct Redis URL."""
@@ -71,3 +99,7 @@ class Settings(BaseSettings):
 def get_settings() -> Settings:
     """Get cached settings instance."""
     return Settings()
+
+
+# Settings instance for module-level access
+SETTINGS = get_settings()
@@ -8,9 +8,9 @@ from sqlalchemy.ext.asyncio import (
     AsyncEngine
 )
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from typing import AsyncGenerator
-from ..config.settings import get_settings
+from ..config.settings import SETTINGS as settings
 from ..utils.logger import get_logger
 
 
@@ -21,10 +21,12 @@ Base = declarative_base()
 class DatabaseManager:
     """Manage async database connections with connection pooling."""
     
+    __slots__ = ("engine", "session_factory", "readonly_session_factory")
+    
     def __init__(self):
         self.engine: AsyncEngine | None = None
         self.session_factory: async_sessionmaker | None = None
-        self.settings = get_settings()
+        self.readonly_session_factory: async_sessionmaker | None = None
     
     async def connect(self):
         """Initialize database connection with connection pooling."""
@@ -33,17 +35,24 @@ class DatabaseManager:
             return
         
         logger.info("Initializing database connection", 
-                   host=self.settings.DB_HOST, 
-                   database=self.settings.DB_NAME)
+                   host=settings.DB_HOST, 
+                   database=settings.DB_NAME)
         
         self.engine = create_async_engine(
-            self.settings.database_url,
-            echo=self.settings.DEBUG,
-            poolclass=QueuePool,
-            pool_size=self.settings.DB_POOL_SIZE,
-            max_overflow=self.settings.DB_MAX_OVERFLOW,
+            # SQLAlchemy's per-connection cache of asyncpg prepared statements
+            f"{settings.database_url}?prepared_statement_cache_size={settings.DB_STATEMENT_CACHE_SIZE}",
+            echo=settings.DEBUG,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
             pool_pre_ping=True,  # Verify connections before using
             pool_recycle=3600,   # Recycle connections after 1 hour
+            pool_use_lifo=True,  # Reuse the most recently returned connection
+            connect_args={
+                "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+                # Short OLTP queries don't benefit from JIT compilation
+                "server_settings": {"jit": "off"},
+            },
         )
         
         self.session_factory = async_sessionmaker(
@@ -54,6 +63,15 @@ class DatabaseManager:
             autoflush=False,
         )
         
+        # Reads run in autocommit on the same pool: no BEGIN, no COMMIT,
+        # and the reset-on-return rollback is a no-op without a transaction
+        self.readonly_session_factory = async_sessionmaker(
+            self.engine.execution_options(isolation_level="AUTOCOMMIT"),
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autoflush=False,
+        )
+        
         logger.info("Database connection initialized successfully")
     
     async def disconnect(self):
@@ -63,9 +81,10 @@ class DatabaseManager:
             await self.engine.dispose()
             self.engine = None
             self.session_factory = None
+            self.readonly_session_factory = None
     
-    async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
-        """Get an async database session."""
+    async def get_rw_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """Get an async database session, committed on success."""
         if self.session_factory is None:
             raise RuntimeError("Database not connected. Call connect() first.")
         
@@ -80,6 +99,22 @@ class DatabaseManager:
             finally:
                 await session.close()
     
+    async def get_readonly_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Get an async database session for reads.
+        
+        The session's connection runs in autocommit mode, so each
+        statement is a single round trip, without the BEGIN and
+        COMMIT/ROLLBACK around it. Never commits; writes made through
+        it are not transactional.
+        """
+        if self.readonly_session_factory is None:
+            raise RuntimeError("Database not connected. Call connect() first.")
+        
+        async with self.readonly_session_factory() as session:
+            session.info["readonly"] = True
+            yield session
+    
     async def create_tables(self):
         """Create all tables in the database."""
         if self.engine is None:
@@ -97,5 +132,11 @@ db_manager = DatabaseManager()
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency for getting database sessions in FastAPI."""
-    async for session in db_manager.get_session():
+    async for session in db_manager.get_rw_session():
+        yield session
+
+
+async def get_readonly_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency for getting read-only database sessions in FastAPI."""
+    async for session in db_manager.get_readonly_session():
         yield session
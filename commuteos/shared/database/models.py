@@ -1,7 +1,8 @@
 """
 Database models for CommuteOS.
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Index, ForeignKey, JSON
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, Index, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from .connection import Base
 
@@ -17,7 +18,7 @@ class Station(Base):
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     station_type = Column(String(50))  # bus, metro, train, etc.
-    station_metadata = Column(JSON, default=dict)
+    station_metadata = Column(JSONB, default=dict)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -38,7 +39,7 @@ class Edge(Base):
     distance = Column(Float, nullable=False)  # in kilometers
     travel_time = Column(Float, nullable=False)  # in minutes
     transport_type = Column(String(50))  # bus, metro, walk, etc.
-    edge_metadata = Column(JSON, default=dict)
+    edge_metadata = Column(JSONB, default=dict)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -56,7 +57,7 @@ class RouteHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     source_station = Column(String(50), nullable=False, index=True)
     target_station = Column(String(50), nullable=False, index=True)
-    route_path = Column(JSON, nullable=False)  # List of station IDs
+    route_path = Column(JSONB, nullable=False)  # List of station IDs
     total_time = Column(Float, nullable=False)  # in minutes
     total_distance = Column(Float)  # in kilometers
     score = Column(Float)  # routing score
@@ -65,6 +66,26 @@ class RouteHistory(Base):
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     __table_args__ = (
-        Index('idx_route_query', 'source_station', 'target_station'),
+        # Latest-route lookups for a pair, newest first. route_path is left out
+        # of INCLUDE: unbounded JSONB can exceed the btree row size limit
+        Index(
+            'idx_route_query',
+            'source_station',
+            'target_station',
+            timestamp.desc(),
+            postgresql_include=['total_time', 'score'],
+        ),
         Index('idx_route_timestamp', 'timestamp'),
+        Index('idx_route_cache_hit', 'cache_hit', postgresql_where=(cache_hit == 1)),
     )
+
+
+class RouteHistoryStats(Base):
+    """Single-row rollup of route history, updated with each history batch."""
+    
+    __tablename__ = "route_history_stats"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Always 1
+    total_queries = Column(BigInteger, nullable=False, default=0)
+    cache_hits = Column(BigInteger, nullable=False, default=0)
+    sum_response_time_ms = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1 @@
+# Graph loading
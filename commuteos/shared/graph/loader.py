@@ -0,0 +1,310 @@
+"""
+Transit graph loader shared by the routing and data ingestion services.
+
+A single pass over the graph file produces both the CSR arrays used for
+routing and the station/edge rows used for database seeding. Graphs can
+be stored as JSON or as a prebuilt binary (.npz) of the CSR arrays and rows,
+built with:
+
+    python -m commuteos.shared.graph.loader
+"""
+import sys
+import numpy as np
+import orjson
+from pathlib import Path
+from typing import Dict, List, Tuple
+from ..utils.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent.parent / "services" / "routing_service" / "data"
+DEFAULT_JSON_FILE = DATA_DIR / "mock_city_graph.json"
+DEFAULT_NPZ_FILE = DATA_DIR / "mock_city_graph.npz"
+
+# Bumped whenever the binary graph layout changes
+NPZ_VERSION = 2
+
+
+def default_graph_file() -> Path:
+    """Get the default graph file, preferring a current prebuilt binary graph."""
+    if not DEFAULT_NPZ_FILE.exists():
+        return DEFAULT_JSON_FILE
+
+    if DEFAULT_JSON_FILE.exists() and DEFAULT_JSON_FILE.stat().st_mtime > DEFAULT_NPZ_FILE.stat().st_mtime:
+        logger.warning("Binary graph is older than the JSON graph, loading JSON instead",
+                      file=str(DEFAULT_NPZ_FILE))
+        return DEFAULT_JSON_FILE
+
+    if _npz_version(DEFAULT_NPZ_FILE) != NPZ_VERSION:
+        logger.warning("Binary graph has an old format, loading JSON instead",
+                      file=str(DEFAULT_NPZ_FILE))
+        return DEFAULT_JSON_FILE
+
+    return DEFAULT_NPZ_FILE
+
+
+def load_graph_csr_and_rows(graph_file: Path) -> Tuple[Dict, List[Dict], List[Dict]]:
+    """
+    Load a graph file into CSR arrays and database rows.
+
+    Args:
+        graph_file: Path to a .npz or JSON graph file
+
+    Returns:
+        Tuple of (csr_arrays, station_rows, edge_rows). csr_arrays holds
+        station_ids, indptr, indices, weights (travel time), distances,
+        transport_types, and latitude/longitude (NaN where missing).
+        Rows are keyed by Station/Edge column names.
+    """
+    if str(graph_file).endswith('.npz'):
+        return _load_npz(graph_file)
+
+    with open(graph_file, 'rb') as f:
+        data = orjson.loads(f.read())
+
+    return build_graph_csr_and_rows(data.get('stations', {}), data.get('edges', []))
+
+
+def build_graph_csr_and_rows(
+    stations: Dict[str, Dict],
+    edges: List[Dict]
+) -> Tuple[Dict, List[Dict], List[Dict]]:
+    """
+    Build CSR arrays and database rows from JSON-layout stations and edges.
+
+    Parallel edges between the same pair keep the last definition,
+    matching a simple directed graph.
+    """
+    station_ids = list(stations)
+    station_index = {sid: i for i, sid in enumerate(station_ids)}
+    num_nodes = len(station_ids)
+
+    latitude = np.full(num_nodes, np.nan, dtype=np.float64)
+    longitude = np.full(num_nodes, np.nan, dtype=np.float64)
+    station_rows = []
+
+    for i, (station_id, station_info) in enumerate(stations.items()):
+        if station_info.get('latitude') is not None:
+            latitude[i] = station_info['latitude']
+        if station_info.get('longitude') is not None:
+            longitude[i] = station_info['longitude']
+
+        station_rows.append({
+            "station_id": station_id,
+            "name": station_info.get('name', station_id),
+            "latitude": station_info.get('latitude', 0.0),
+            "longitude": station_info.get('longitude', 0.0),
+            "station_type": station_info.get('type', 'unknown'),
+            "station_metadata": {}
+        })
+
+    # Per-source adjacency: target index -> (travel_time, distance, transport_type)
+    adjacency: List[Dict[int, Tuple[float, float, str]]] = [{} for _ in range(num_nodes)]
+    edge_rows = []
+
+    for idx, edge_info in enumerate(edges):
+        source, target = edge_info['source'], edge_info['target']
+        travel_time = edge_info.get('travel_time', 0.0)
+        distance = edge_info.get('distance', 0.0)
+        transport_type = edge_info.get('transport_type', 'unknown')
+
+        edge_rows.append({
+            "edge_id": f"edge_{source}_{target}_{idx}",
+            "source_station": source,
+            "target_station": target,
+            "distance": distance,
+            "travel_time": travel_time,
+            "transport_type": transport_type,
+            "edge_metadata": {}
+        })
+
+        if source not in station_index or target not in station_index:
+            logger.warning("Edge references unknown station, skipping for routing",
+                          source=source,
+                          target=target)
+            continue
+
+        adjacency[station_index[source]][station_index[target]] = (
+            travel_time, distance, transport_type
+        )
+
+    num_edges = sum(len(targets) for targets in adjacency)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int32)
+    indices = np.empty(num_edges, dtype=np.int32)
+    weights = np.empty(num_edges, dtype=np.float64)
+    distances = np.empty(num_edges, dtype=np.float64)
+    transport_types = []
+
+    pos = 0
+    for i, targets in enumerate(adjacency):
+        for target, (travel_time, distance, transport_type) in targets.items():
+            indices[pos] = target
+            weights[pos] = travel_time
+            distances[pos] = distance
+            transport_types.append(transport_type)
+            pos += 1
+        indptr[i + 1] = pos
+
+    csr_arrays = {
+        "station_ids": station_ids,
+        "indptr": indptr,
+        "indices": indices,
+        "weights": weights,
+        "distances": distances,
+        "transport_types": transport_types,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+    return csr_arrays, station_rows, edge_rows
+
+
+def _float_column(values: List) -> np.ndarray:
+    """Store an optional float column, None as NaN."""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _str_column(values: List) -> np.ndarray:
+    """Store an optional string column, None as an empty string."""
+    return np.array([v or '' for v in values], dtype=str)
+
+
+def _from_float_column(values: np.ndarray) -> List:
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+def _from_str_column(values: np.ndarray) -> List:
+    return [v or None for v in values.tolist()]
+
+
+def save_graph_npz(
+    npz_file: Path,
+    csr_arrays: Dict,
+    station_rows: List[Dict],
+    edge_rows: List[Dict]
+) -> None:
+    """
+    Write CSR arrays and database rows as a binary graph.
+
+    Rows are stored column-wise as loaded from JSON, so the binary
+    graph seeds exactly the same stations and edges (including edges
+    that routing skips).
+
+    Args:
+        npz_file: Output path
+        csr_arrays: CSR arrays from load_graph_csr_and_rows
+        station_rows: Station rows from load_graph_csr_and_rows
+        edge_rows: Edge rows from load_graph_csr_and_rows
+    """
+    np.savez(
+        npz_file,
+        version=np.array(NPZ_VERSION),
+        station_ids=np.array(csr_arrays['station_ids'], dtype=str),
+        latitude=csr_arrays['latitude'],
+        longitude=csr_arrays['longitude'],
+        indptr=csr_arrays['indptr'],
+        indices=csr_arrays['indices'],
+        weights=csr_arrays['weights'],
+        distances=csr_arrays['distances'],
+        transport_types=_str_column(csr_arrays['transport_types']),
+        station_names=_str_column([row['name'] for row in station_rows]),
+        station_types=_str_column([row['station_type'] for row in station_rows]),
+        station_latitude=_float_column([row['latitude'] for row in station_rows]),
+        station_longitude=_float_column([row['longitude'] for row in station_rows]),
+        edge_ids=_str_column([row['edge_id'] for row in edge_rows]),
+        edge_sources=_str_column([row['source_station'] for row in edge_rows]),
+        edge_targets=_str_column([row['target_station'] for row in edge_rows]),
+        edge_distances=_float_column([row['distance'] for row in edge_rows]),
+        edge_travel_times=_float_column([row['travel_time'] for row in edge_rows]),
+        edge_transport_types=_str_column([row['transport_type'] for row in edge_rows]),
+    )
+
+
+def _array_version(arrays) -> int:
+    """Format version of loaded binary graph arrays (1 predates versioning)."""
+    return int(arrays['version']) if 'version' in arrays else 1
+
+
+def _npz_version(npz_file: Path) -> int:
+    """Format version of a binary graph file."""
+    with np.load(npz_file) as arrays:
+        return _array_version(arrays)
+
+
+def _load_npz(npz_file: Path) -> Tuple[Dict, List[Dict], List[Dict]]:
+    """Load a binary graph written by save_graph_npz."""
+    with np.load(npz_file) as arrays:
+        version = _array_version(arrays)
+        if version != NPZ_VERSION:
+            raise ValueError(
+                f"Binary graph {npz_file} has format version {version}, expected "
+                f"{NPZ_VERSION}; rebuild it with: python -m commuteos.shared.graph.loader"
+            )
+
+        station_ids = arrays['station_ids'].tolist()
+        csr_arrays = {
+            "station_ids": station_ids,
+            "indptr": arrays['indptr'],
+            "indices": arrays['indices'],
+            "weights": arrays['weights'],
+            "distances": arrays['distances'],
+            "transport_types": _from_str_column(arrays['transport_types']),
+            "latitude": arrays['latitude'],
+            "longitude": arrays['longitude'],
+        }
+        station_columns = zip(
+            station_ids,
+            _from_str_column(arrays['station_names']),
+            _from_float_column(arrays['station_latitude']),
+            _from_float_column(arrays['station_longitude']),
+            _from_str_column(arrays['station_types']),
+        )
+        edge_columns = zip(
+            _from_str_column(arrays['edge_ids']),
+            _from_str_column(arrays['edge_sources']),
+            _from_str_column(arrays['edge_targets']),
+            _from_float_column(arrays['edge_distances']),
+            _from_float_column(arrays['edge_travel_times']),
+            _from_str_column(arrays['edge_transport_types']),
+        )
+
+        station_rows = [
+            {
+                "station_id": station_id,
+                "name": name,
+                "latitude": latitude,
+                "longitude": longitude,
+                "station_type": station_type,
+                "station_metadata": {}
+            }
+            for station_id, name, latitude, longitude, station_type in station_columns
+        ]
+        edge_rows = [
+            {
+                "edge_id": edge_id,
+                "source_station": source,
+                "target_station": target,
+                "distance": distance,
+                "travel_time": travel_time,
+                "transport_type": transport_type,
+                "edge_metadata": {}
+            }
+            for edge_id, source, target, distance, travel_time, transport_type in edge_columns
+        ]
+
+    return csr_arrays, station_rows, edge_rows
+
+
+def main(json_file: Path = DEFAULT_JSON_FILE, npz_file: Path = DEFAULT_NPZ_FILE) -> None:
+    """Build the binary graph from a JSON graph file."""
+    csr_arrays, station_rows, edge_rows = load_graph_csr_and_rows(json_file)
+    save_graph_npz(npz_file, csr_arrays, station_rows, edge_rows)
+
+    logger.info("Binary graph written",
+               file=str(npz_file),
+               nodes=len(csr_arrays['station_ids']),
+               edges=len(csr_arrays['indices']))
+
+
+if __name__ == "__main__":
+    main(*[Path(arg) for arg in sys.argv[1:3]])
@@ -1,6 +1,7 @@
 """
 Pydantic schemas for API request/response validation.
 """
+import msgspec
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
@@ -32,6 +33,24 @@ class RouteResponse(BaseModel):
         }
 
 
+class RouteResponseMsg(msgspec.Struct, kw_only=True):
+    """
+    msgspec counterpart of RouteResponse for the route hot path.
+    
+    Same fields in the same order; encodes to the same JSON in a single
+    pass with ROUTE_ENCODER. ``cached`` is declared last, so an encoded
+    route always ends with the flag.
+    """
+    path: List[str]
+    estimated_time: float
+    distance: Optional[float] = None
+    base_score: float
+    cached: bool = False
+
+
+ROUTE_ENCODER = msgspec.json.Encoder()
+
+
 class HealthResponse(BaseModel):
     """Health check response schema."""
     status: str = Field(..., description="Service status")
@@ -0,0 +1,91 @@
+"""
+Batching queue for CommuteOS background writers.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+from .logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class BatchQueue:
+    """
+    Bounded queue drained in batches by a single background task.
+
+    Items are collected until max_batch are pending or max_delay_ms
+    has passed since the first one, then handed to an async handler.
+    The queue holds max_size items and drops the oldest on overflow,
+    so a stalled consumer can't grow it without bound.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[List[Any]], Awaitable[None]],
+        max_batch: int,
+        max_delay_ms: float,
+        max_size: int
+    ):
+        self.name = name
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay_ms = max_delay_ms
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the background drain task."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Hand pending items to the handler, then stop the drain task."""
+        if self.task is not None:
+            self._enqueue(self._STOP)
+            await self.task
+            self.task = None
+
+    def put(self, item: Any) -> None:
+        """Queue an item, dropping the oldest one if the queue is full."""
+        self._enqueue(item)
+
+    def _enqueue(self, item: Any) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            logger.warning("Batch queue full, dropped oldest item", queue=self.name)
+        self.queue.put_nowait(item)
+
+    async def _run(self):
+        """Drain the queue into batches until stopped."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self.queue.get()
+            if item is self._STOP:
+                break
+
+            batch: List[Any] = [item]
+            deadline = loop.time() + self.max_delay_ms / 1000
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                await self.handler(batch)
+            except Exception:
+                logger.error("Batch handler failed", queue=self.name,
+                            items=len(batch), exc_info=True)
@@ -1,12 +1,44 @@
 """
 Structured logging utility for CommuteOS.
 """
+import atexit
 import logging
+import queue
 import sys
-import json
-from datetime import datetime
+import orjson
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, Dict
-from ..config.settings import get_settings
+from ..config.settings import SETTINGS as settings
+
+
+# Standard LogRecord attributes, excluded from the structured fields
+RESERVED_ATTRS = frozenset({
+    'name', 'msg', 'args', 'created', 'filename',
+    'funcName', 'levelname', 'levelno', 'lineno',
+    'module', 'msecs', 'message', 'pathname',
+    'process', 'processName', 'relativeCreated',
+    'thread', 'threadName', 'exc_info', 'exc_text',
+    'stack_info', 'taskName',
+})
+
+
+class _PassThroughQueueHandler(QueueHandler):
+    """Queue records as-is; formatting happens on the listener thread."""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same-process queue, so the record doesn't need to be pickle-safe
+        return record
+
+
+# Records are formatted and written by a background thread, keeping
+# formatting and stdout I/O off the event loop
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_stream_handler = logging.StreamHandler(sys.stdout)
+_listener = QueueListener(_log_queue, _stream_handler, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
 
 
 class StructuredLogger:
@@ -14,47 +46,46 @@ class StructuredLogger:
     
     def __init__(self, name: str):
         self.logger = logging.getLogger(name)
-        settings = get_settings()
-        
-        # Set log level
-        self.logger.setLevel(getattr(logging, settings.LOG_LEVEL))
-        
-        # Create handler
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(getattr(logging, settings.LOG_LEVEL))
-        
-        # Set formatter based on config
-        if settings.LOG_FORMAT == "json":
-            handler.setFormatter(JsonFormatter())
-        else:
-            handler.setFormatter(logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            ))
         
         # Avoid duplicate handlers
         if not self.logger.handlers:
-            self.logger.addHandler(handler)
+            self.logger.setLevel(LOG_LEVEL)
+            self.logger.addHandler(_queue_handler)
+        
+        # Levels are fixed at startup, so hot paths can check this flag
+        # instead of building debug records that would be dropped
+        self._debug_enabled = self.logger.isEnabledFor(logging.DEBUG)
     
-    def _log(self, level: str, message: str, **kwargs):
-        """Internal log method with structured data."""
-        log_method = getattr(self.logger, level)
-        log_method(message, extra=kwargs)
+    @property
+    def debug_enabled(self) -> bool:
+        """Whether debug records are emitted."""
+        return self._debug_enabled
+    
+    def _log(self, level: int, message: str, exc_info: bool = False, **kwargs):
+        """
+        Internal log method with structured data.
+        
+        With exc_info=True the current exception is attached to the
+        record and only formatted if the record is emitted.
+        """
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, exc_info=exc_info, extra=kwargs)
     
-    def info(self, message: str, **kwargs):
+    def info(self, message: str, exc_info: bool = False, **kwargs):
         """Log info level message."""
-        self._log("info", message, **kwargs)
+        self._log(logging.INFO, message, exc_info, **kwargs)
     
-    def error(self, message: str, **kwargs):
+    def error(self, message: str, exc_info: bool = False, **kwargs):
         """Log error level message."""
-        self._log("error", message, **kwargs)
+        self._log(logging.ERROR, message, exc_info, **kwargs)
     
-    def warning(self, message: str, **kwargs):
+    def warning(self, message: str, exc_info: bool = False, **kwargs):
         """Log warning level message."""
-        self._log("warning", message, **kwargs)
+        self._log(logging.WARNING, message, exc_info, **kwargs)
     
-    def debug(self, message: str, **kwargs):
+    def debug(self, message: str, exc_info: bool = False, **kwargs):
         """Log debug level message."""
-        self._log("debug", message, **kwargs)
+        self._log(logging.DEBUG, message, exc_info, **kwargs)
 
 
 class JsonFormatter(logging.Formatter):
@@ -62,30 +93,39 @@ class JsonFormatter(logging.Formatter):
     
     def format(self, record: logging.LogRecord) -> str:
         log_data: Dict[str, Any] = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
         }
         
         # Add extra fields
-        if hasattr(record, '__dict__'):
-            for key, value in record.__dict__.items():
-                if key not in ['name', 'msg', 'args', 'created', 'filename', 
-                              'funcName', 'levelname', 'levelno', 'lineno',
-                              'module', 'msecs', 'message', 'pathname', 
-                              'process', 'processName', 'relativeCreated',
-                              'thread', 'threadName', 'exc_info', 'exc_text',
-                              'stack_info']:
-                    log_data[key] = value
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS:
+                log_data[key] = value
         
         # Add exception info if present
         if record.exc_info:
             log_data['exception'] = self.formatException(record.exc_info)
         
-        return json.dumps(log_data)
+        return orjson.dumps(log_data, default=str).decode()
+
+
+# Handlers are configured once at import and shared by every logger
+LOG_LEVEL = getattr(logging, settings.LOG_LEVEL)
+
+_stream_handler.setLevel(LOG_LEVEL)
+if settings.LOG_FORMAT == "json":
+    _stream_handler.setFormatter(JsonFormatter())
+else:
+    _stream_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    ))
+
+_queue_handler = _PassThroughQueueHandler(_log_queue)
 
 
+@lru_cache(maxsize=None)
 def get_logger(name: str) -> StructuredLogger:
     """Get a structured logger instance."""
     return StructuredLogger(name)
@@ -0,0 +1,70 @@
+"""
+ASGI middleware for CommuteOS services.
+"""
+import time
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI request timing middleware.
+
+    Avoids the Request/Response wrappers and extra task that
+    BaseHTTPMiddleware creates per call. Adds an ``x-response-time``
+    header and exposes the timing on ``request.state``; per-request
+    log records are only emitted at DEBUG.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        start_time = time.perf_counter()
+        state["start_time"] = start_time
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_time = (time.perf_counter() - start_time) * 1000
+                state["response_time_ms"] = response_time
+
+                headers = list(message.get("headers", []))
+                headers.append((b"x-response-time", f"{response_time:.2f}ms".encode()))
+                message["headers"] = headers
+
+                if logger.debug_enabled:
+                    logger.debug("Request completed",
+                                method=scope["method"],
+                                path=scope["path"],
+                                status_code=message["status"],
+                                time_ms=round(response_time, 2))
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def get_response_time_ms(request: Request) -> float:
+    """
+    Get the response time recorded by TimingMiddleware.
+
+    Falls back to the time elapsed so far if the response
+    has not started yet.
+    """
+    response_time = getattr(request.state, "response_time_ms", None)
+    if response_time is not None:
+        return response_time
+
+    start_time = getattr(request.state, "start_time", None)
+    if start_time is None:
+        return 0.0
+    return (time.perf_counter() - start_time) * 1000
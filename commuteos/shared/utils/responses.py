@@ -0,0 +1,20 @@
+"""
+Response classes for CommuteOS services.
+"""
+from typing import Any
+from starlette.responses import Response
+from ..schemas.route_schemas import ROUTE_ENCODER
+
+
+class MsgspecJSONResponse(Response):
+    """
+    JSON response rendered with msgspec.
+
+    Encodes msgspec Structs (and plain Python values) in one pass,
+    without a Pydantic dump step.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return ROUTE_ENCODER.encode(content)
@@ -1,10 +1,35 @@
 # CommuteOS Test Suite
 # Run with: pytest
 
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+import msgspec
+import numpy as np
+import orjson
 import pytest
-from httpx import AsyncClient
-from commuteos.services.api_gateway.main import app as gateway_app
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient, MockTransport, Response
+from commuteos.services.api_gateway.history_writer import to_record
+from commuteos.services.api_gateway.main import RouteHistoryBuffer, RoutingBatcher, app as gateway_app, mark_cached
 from commuteos.services.routing_service.main import app as routing_app
+from commuteos.services.routing_service.routing_engine import RoutingEngine
+from commuteos.shared.cache.redis_cache import (
+    ZSTD_MARKER,
+    CacheManager,
+    GetCoalescer,
+    _dumps,
+    _loads,
+    compress_raw,
+)
+from commuteos.shared.config.settings import Settings
+from commuteos.shared.schemas.route_schemas import ROUTE_ENCODER, RouteRequest, RouteResponseMsg
+from commuteos.shared.utils.batching import BatchQueue
+from commuteos.shared.graph import loader
+from commuteos.shared.graph.loader import DEFAULT_JSON_FILE, load_graph_csr_and_rows, save_graph_npz
 
 
 @pytest.fixture
@@ -12,58 +37,438 @@ def anyio_backend():
     return "asyncio"
 
 
+@pytest_asyncio.fixture(scope="module")
+async def gateway_client():
+    """Shared client for the API Gateway (no lifespan; Redis/Postgres aren't needed)."""
+    async with AsyncClient(transport=ASGITransport(app=gateway_app), base_url="http://test") as client:
+        yield client
+
+
+@pytest_asyncio.fixture(scope="module")
+async def routing_client():
+    """Shared client for the Routing Service, with its lifespan (graph load) run once."""
+    async with routing_app.router.lifespan_context(routing_app):
+        async with AsyncClient(transport=ASGITransport(app=routing_app), base_url="http://test") as client:
+            yield client
+
+
 class TestAPIGateway:
     """Test suite for API Gateway."""
     
-    @pytest.mark.asyncio
-    async def test_health_check(self):
+    @pytest.mark.asyncio(scope="module")
+    async def test_health_check(self, gateway_client):
         """Test health check endpoint."""
-        async with AsyncClient(app=gateway_app, base_url="http://test") as client:
-            response = await client.get("/health")
-            assert response.status_code == 200
-            data = response.json()
-            assert data["status"] == "healthy"
-            assert data["service"] == "api_gateway"
+        response = await gateway_client.get("/health")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "healthy"
+        assert data["service"] == "api_gateway"
     
-    @pytest.mark.asyncio
-    async def test_root_endpoint(self):
+    @pytest.mark.asyncio(scope="module")
+    async def test_root_endpoint(self, gateway_client):
         """Test root endpoint."""
-        async with AsyncClient(app=gateway_app, base_url="http://test") as client:
-            response = await client.get("/")
-            assert response.status_code == 200
-            data = response.json()
-            assert "service" in data
-            assert "version" in data
+        response = await gateway_client.get("/")
+        assert response.status_code == 200
+        data = response.json()
+        assert "service" in data
+        assert "version" in data
+    
+    @pytest.mark.asyncio(scope="module")
+    async def test_response_time_header(self, gateway_client):
+        """Test timing middleware adds response time header."""
+        response = await gateway_client.get("/health")
+        assert response.status_code == 200
+        assert response.headers["x-response-time"].endswith("ms")
+    
+    def test_mark_cached(self):
+        """Test cached route JSON gets the cached flag without re-encoding."""
+        route = {"path": ["Station_A", "Station_B"], "estimated_time": 12.0, "distance": 2.5, "base_score": 0.8}
+        body = ROUTE_ENCODER.encode(RouteResponseMsg(**route))
+        assert orjson.loads(body) == {**route, "cached": False}
+        assert orjson.loads(mark_cached(body)) == {**route, "cached": True}
+        assert orjson.loads(mark_cached(orjson.dumps(route))) == {**route, "cached": True}
+
+
+def fake_route(pair: dict) -> dict:
+    """Routing service result for a source/destination pair."""
+    return {"path": [pair["source"], pair["destination"]], "estimated_time": 5.0, "distance": 1.0, "base_score": 0.9}
+
+
+class TestRoutingBatcher:
+    """Test suite for gateway-side routing call batching."""
+    
+    @pytest.mark.asyncio
+    async def test_short_batch_resolves_every_request(self):
+        """Test a batch response missing results fails its requests instead of hanging."""
+        def handler(request):
+            return Response(200, json=[fake_route(pair) for pair in orjson.loads(request.content)][:-1])
+        
+        batcher = RoutingBatcher()
+        async with AsyncClient(transport=MockTransport(handler), base_url="http://routing") as client:
+            results = await asyncio.wait_for(asyncio.gather(*(
+                batcher.compute(client, RouteRequest(source="Station_A", destination=f"Station_{n}"))
+                for n in range(3)
+            )), 2)
+        
+        assert results == [None, None, None]
+    
+    @pytest.mark.asyncio
+    async def test_batches_split_to_max_size(self):
+        """Test misses beyond the batch size limit go out in several calls."""
+        batch_sizes = []
+        
+        def handler(request):
+            pairs = orjson.loads(request.content)
+            batch_sizes.append(len(pairs))
+            if len(pairs) > 4:
+                return Response(413)
+            return Response(200, json=[fake_route(pair) for pair in pairs])
+        
+        batcher = RoutingBatcher(max_batch_size=4)
+        async with AsyncClient(transport=MockTransport(handler), base_url="http://routing") as client:
+            results = await asyncio.wait_for(asyncio.gather(*(
+                batcher.compute(client, RouteRequest(source="Station_A", destination=f"Station_{n}"))
+                for n in range(10)
+            )), 2)
+        
+        assert sorted(batch_sizes) == [2, 4, 4]
+        assert [result["path"][-1] for result in results] == [f"Station_{n}" for n in range(10)]
+    
+    @pytest.mark.asyncio
+    async def test_misses_batch_behind_inflight_call(self):
+        """Test a lone miss is sent at once and later ones share the next call."""
+        paths = []
+        
+        async def handler(request):
+            paths.append(request.url.path)
+            await asyncio.sleep(0.01)
+            body = orjson.loads(request.content)
+            if isinstance(body, list):
+                return Response(200, json=[fake_route(pair) for pair in body])
+            return Response(200, json=fake_route(body))
+        
+        batcher = RoutingBatcher()
+        async with AsyncClient(transport=MockTransport(handler), base_url="http://routing") as client:
+            first = asyncio.create_task(
+                batcher.compute(client, RouteRequest(source="Station_A", destination="Station_B"))
+            )
+            await asyncio.sleep(0.001)
+            assert paths == ["/compute"]
+            
+            await asyncio.wait_for(asyncio.gather(first, *(
+                batcher.compute(client, RouteRequest(source="Station_A", destination=f"Station_{n}"))
+                for n in range(3)
+            )), 2)
+        
+        assert paths == ["/compute", "/compute_batch"]
+
+
+class FakeWritePool(Executor):
+    """Stand-in for the history writer pool, optionally already broken."""
+    
+    def __init__(self, broken: bool):
+        self.broken = broken
+        self.rows = []
+    
+    def submit(self, fn, rows):
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool("A process in the pool was terminated abruptly"))
+        else:
+            self.rows.extend(rows)
+            future.set_result(len(self.rows))
+        return future
+
+
+class TestRouteHistoryBuffer:
+    """Test suite for batched route history writes."""
+    
+    @pytest.mark.asyncio
+    async def test_broken_pool_is_replaced(self):
+        """Test a batch hitting a broken writer pool is retried on a new pool."""
+        broken, healthy = FakeWritePool(broken=True), FakeWritePool(broken=False)
+        pools = iter([broken, healthy])
+        buffer = RouteHistoryBuffer(max_batch=10, max_delay_ms=1, workers=2, dsn="")
+        buffer._new_pool = lambda: next(pools)
+        buffer.start()
+        
+        for n in range(3):
+            await buffer.put({"n": n})
+        await buffer.stop()
+        
+        assert healthy.rows == [{"n": 0}, {"n": 1}, {"n": 2}]
+    
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_oldest(self):
+        """Test queued history rows drop the oldest entry on overflow."""
+        buffer = RouteHistoryBuffer(max_batch=10, max_delay_ms=1, workers=1, dsn="", max_queue=2)
+        for n in range(3):
+            await buffer.put({"n": n})
+        
+        rows = [buffer.rows.queue.get_nowait() for _ in range(2)]
+        assert rows == [{"n": 1}, {"n": 2}]
+    
+    def test_record_from_route_body(self):
+        """Test queued rows are converted to COPY records from the route JSON."""
+        body = ROUTE_ENCODER.encode(RouteResponseMsg(
+            path=["Station_A", "Station_B"], estimated_time=12.0, distance=3.5, base_score=0.8
+        ))
+        record = to_record(("Station_A", "Station_B", body, 1, 4.2, 0.0))
+        assert record[:8] == ("Station_A", "Station_B", '["Station_A","Station_B"]', 12.0, 3.5, 0.8, 1, 4.2)
+        assert record[8] == datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 class TestRoutingService:
     """Test suite for Routing Service."""
     
-    @pytest.mark.asyncio
-    async def test_health_check(self):
+    @pytest.mark.asyncio(scope="module")
+    async def test_health_check(self, routing_client):
         """Test health check endpoint."""
-        async with AsyncClient(app=routing_app, base_url="http://test") as client:
-            response = await client.get("/health")
-            assert response.status_code == 200
-            data = response.json()
-            assert data["status"] == "healthy"
-            assert data["service"] == "routing_service"
+        response = await routing_client.get("/health")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "healthy"
+        assert data["service"] == "routing_service"
     
-    @pytest.mark.asyncio
-    async def test_compute_route(self):
+    @pytest.mark.asyncio(scope="module")
+    async def test_compute_route(self, routing_client):
         """Test route computation."""
-        async with AsyncClient(app=routing_app, base_url="http://test") as client:
-            response = await client.post(
-                "/compute",
-                json={
-                    "source": "Station_A",
-                    "destination": "Station_B"
-                }
-            )
-            assert response.status_code == 200
-            data = response.json()
-            assert "path" in data
-            assert "estimated_time" in data
-            assert "base_score" in data
-            assert data["path"][0] == "Station_A"
-            assert data["path"][-1] == "Station_B"
+        response = await routing_client.post(
+            "/compute",
+            json={
+                "source": "Station_A",
+                "destination": "Station_B"
+            }
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert "path" in data
+        assert "estimated_time" in data
+        assert "base_score" in data
+        assert data["path"][0] == "Station_A"
+        assert data["path"][-1] == "Station_B"
+
+
+class TestRoutingEngine:
+    """Test suite for the routing engine."""
+    
+    @pytest.mark.parametrize("use_csr", [True, False])
+    def test_precomputed_routes_match_on_demand(self, use_csr):
+        """Test precomputed routes match per-request Dijkstra."""
+        precomputed = RoutingEngine(use_csr=use_csr)
+        precomputed.load_graph()
+        on_demand = RoutingEngine(precompute_max_nodes=0, use_csr=use_csr)
+        on_demand.load_graph()
+        
+        for source in precomputed.stations_data:
+            for destination in precomputed.stations_data:
+                expected = on_demand.compute_route(source, destination)
+                actual = precomputed.compute_route(source, destination)
+                if expected is None:
+                    assert actual is None
+                else:
+                    assert actual["estimated_time"] == expected["estimated_time"]
+                    assert actual["path"][0] == source
+                    assert actual["path"][-1] == destination
+    
+    @pytest.mark.parametrize("precompute_max_nodes", [2000, 0])
+    def test_compute_routes_batch(self, precompute_max_nodes):
+        """Test batch route computation matches single-pair queries."""
+        engine = RoutingEngine(precompute_max_nodes=precompute_max_nodes)
+        engine.load_graph()
+        
+        pairs = [
+            (source, destination)
+            for source in engine.stations_data
+            for destination in engine.stations_data
+        ]
+        pairs.append(("Station_A", "Unknown"))
+        
+        results = engine.compute_routes(pairs)
+        
+        assert len(results) == len(pairs)
+        assert results[-1] is None
+        for (source, destination), result in zip(pairs[:-1], results[:-1]):
+            assert result == engine.compute_route(source, destination)
+    
+    def test_binary_graph_matches_json(self, tmp_path):
+        """Test the prebuilt binary graph routes like the JSON graph."""
+        json_engine = RoutingEngine()
+        json_engine.load_graph(str(DEFAULT_JSON_FILE))
+        
+        npz_file = tmp_path / "graph.npz"
+        csr_arrays, station_rows, edge_rows = load_graph_csr_and_rows(DEFAULT_JSON_FILE)
+        save_graph_npz(npz_file, csr_arrays, station_rows, edge_rows)
+        binary_engine = RoutingEngine()
+        binary_engine.load_graph(str(npz_file))
+        
+        _, binary_station_rows, binary_edge_rows = load_graph_csr_and_rows(npz_file)
+        assert binary_station_rows == station_rows
+        assert binary_edge_rows == edge_rows
+        assert binary_engine.stations_data == json_engine.stations_data
+        for source in json_engine.stations_data:
+            for destination in json_engine.stations_data:
+                assert (
+                    binary_engine.compute_route(source, destination) ==
+                    json_engine.compute_route(source, destination)
+                )
+    
+    def test_default_graph_skips_stale_binary(self, tmp_path, monkeypatch):
+        """Test the JSON graph is used when it is newer than the binary graph."""
+        json_file = tmp_path / "graph.json"
+        npz_file = tmp_path / "graph.npz"
+        json_file.write_bytes(DEFAULT_JSON_FILE.read_bytes())
+        save_graph_npz(npz_file, *load_graph_csr_and_rows(json_file))
+        monkeypatch.setattr(loader, "DEFAULT_JSON_FILE", json_file)
+        monkeypatch.setattr(loader, "DEFAULT_NPZ_FILE", npz_file)
+        
+        os.utime(json_file, (0, 0))
+        assert loader.default_graph_file() == npz_file
+        
+        os.utime(json_file)
+        os.utime(npz_file, (0, 0))
+        assert loader.default_graph_file() == json_file
+
+
+class FakePipeline:
+    """Stand-in for a Redis pipeline that answers MGET with fixed values."""
+    
+    def __init__(self, cache):
+        self.cache = cache
+    
+    def mget(self, keys):
+        self.cache.batches.append(keys)
+    
+    async def execute(self):
+        await asyncio.sleep(self.cache.delay)
+        return [self.cache.values or [None] * len(self.cache.batches[-1])]
+
+
+class FakeMGetCache(CacheManager):
+    """CacheManager whose pipelines answer MGET with fixed values (or misses)."""
+    
+    def __init__(self, values=None, delay=0):
+        super().__init__()
+        self.values = values
+        self.delay = delay
+        self.batches = []
+    
+    @asynccontextmanager
+    async def pipeline(self):
+        yield FakePipeline(self)
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis client's GET/SET commands."""
+    
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.executed = 0
+    
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+    
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+        self.ttls[key] = ttl
+    
+    async def execute(self):
+        self.executed += 1
+    
+    @asynccontextmanager
+    async def pipeline(self, transaction=True):
+        yield self
+
+
+class TestCacheCodec:
+    """Test suite for cache value serialization."""
+    
+    def test_roundtrip_and_legacy_json(self):
+        """Test msgpack values round-trip and legacy JSON values still decode."""
+        stats = {"total_queries": 10, "cache_hits": 4, "cache_hit_rate": 40.0}
+        assert _dumps(stats).startswith(b"v1:")
+        assert _loads(_dumps(stats)) == stats
+        assert _loads(orjson.dumps(stats)) == stats
+    
+    def test_large_values_compressed(self):
+        """Test values over the size threshold are stored zstd-compressed."""
+        route = {"path": [f"Station_{n}" for n in range(200)], "estimated_time": 95.0}
+        encoded = _dumps(route)
+        assert encoded.startswith(ZSTD_MARKER)
+        assert len(encoded) < len(orjson.dumps(route))
+        assert _loads(encoded) == route
+    
+    @pytest.mark.asyncio
+    async def test_raw_route_bodies_compressed(self):
+        """Test large raw route bodies are compressed and read back decompressed."""
+        route = RouteResponseMsg(
+            path=[f"Station_{n}" for n in range(200)], estimated_time=95.0, base_score=0.8
+        )
+        body = ROUTE_ENCODER.encode(route)
+        stored = compress_raw(body)
+        assert stored.startswith(ZSTD_MARKER)
+        assert len(stored) < len(body)
+        assert compress_raw(b"{}") == b"{}"
+        
+        lookup = GetCoalescer(FakeMGetCache([stored, b"{}", None]), raw=True)
+        values = await asyncio.gather(*(lookup.get(key) for key in ("big", "small", "missing")))
+        assert values == [body, b"{}", None]
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("raw", [False, True])
+    async def test_undecodable_lookup_is_a_miss(self, raw):
+        """Test a corrupt cached value resolves as a miss without stalling other keys."""
+        good = b"{}" if raw else _dumps({})
+        lookup = GetCoalescer(FakeMGetCache([b"\x01garbage" if raw else b"not json", good]), raw=raw)
+        values = await asyncio.wait_for(asyncio.gather(lookup.get("bad"), lookup.get("good")), 1)
+        assert values == [None, b"{}" if raw else {}]
+    
+    @pytest.mark.asyncio
+    async def test_lookups_batch_behind_inflight_mget(self):
+        """Test a lone lookup is sent at once and later ones share the next MGET."""
+        cache = FakeMGetCache(delay=0.01)
+        lookup = GetCoalescer(cache)
+        first = asyncio.create_task(lookup.get("a"))
+        await asyncio.sleep(0.001)
+        assert cache.batches == [["commuteos:a"]]
+        
+        await asyncio.gather(first, lookup.get("b"), lookup.get("c"))
+        assert cache.batches == [["commuteos:a"], ["commuteos:b", "commuteos:c"]]
+    
+    @pytest.mark.asyncio
+    async def test_mset_and_mget(self):
+        """Test mset writes every key in one pipeline and mget returns misses as None."""
+        cache = CacheManager()
+        cache.redis_client = FakeRedis()
+        
+        assert await cache.mset({"a": {"n": 1}, "b": [1, 2]}, ttl=30)
+        assert cache.redis_client.executed == 1
+        assert cache.redis_client.ttls == {"commuteos:a": 30, "commuteos:b": 30}
+        assert await cache.mget(["a", "missing", "b"]) == [{"n": 1}, None, [1, 2]]
+        assert await cache.mget([]) == []
+    
+    def test_write_queue_drops_oldest(self):
+        """Test queued cache writes drop the oldest entry on overflow."""
+        cache = CacheManager()
+        cache._writes = BatchQueue("cache writes", cache._flush_writes, max_batch=10, max_delay_ms=1, max_size=2)
+        for n in range(3):
+            cache.set_raw_async(f"key:{n}", b"{}", ttl=60)
+        
+        keys = [cache._writes.queue.get_nowait()[0] for _ in range(2)]
+        assert keys == ["commuteos:key:1", "commuteos:key:2"]
+    
+    def test_struct_and_numpy_values(self):
+        """Test msgspec Structs and NumPy arrays encode as plain values."""
+        route = RouteResponseMsg(path=["Station_A", "Station_B"], estimated_time=12.0, base_score=0.8)
+        assert _loads(_dumps(route)) == msgspec.structs.asdict(route)
+        assert _loads(_dumps({"times": np.array([1.5, 2.5])})) == {"times": [1.5, 2.5]}
+
+
+class TestSettings:
+    """Test suite for settings compatibility."""
+    
+    def test_deprecated_redis_pool_size(self):
+        """Test REDIS_POOL_SIZE from older .env files still sets the pool cap."""
+        assert Settings(_env_file=None, REDIS_POOL_SIZE=10).REDIS_POOL_MAX_SIZE == 10
+        assert Settings(_env_file=None, REDIS_POOL_SIZE=10, REDIS_POOL_MAX_SIZE=4).REDIS_POOL_MAX_SIZE == 4